@@ -34,6 +34,7 @@ import argparse
 
 from qt_gui.plugin import Plugin
 
+from .bag_cache import get_chunk_cache, get_message_cache
 from .bag_widget import BagWidget
 
 
@@ -53,6 +54,15 @@ class Bag(Plugin):
         context.add_widget(self._widget)
 
         args = self._parse_args(context.argv())
+        if args.message_cache_size is not None:
+            get_message_cache().byte_budget = args.message_cache_size * 1024 * 1024
+        if args.chunk_cache_size is not None:
+            get_chunk_cache().byte_budget = args.chunk_cache_size * 1024 * 1024
+        self._widget.use_mmap = not args.no_mmap
+        if args.clock_frequency is not None:
+            self._widget._timeline.clock_frequency = args.clock_frequency
+        if args.clock:
+            self._widget._timeline.start_publishing_clock()
         for bagfile in args.bagfiles:
             self._widget.load_bag(bagfile)
 
@@ -65,6 +75,11 @@ class Bag(Plugin):
     def add_arguments(parser):
         group = parser.add_argument_group('Options for rqt_bag plugin')
         group.add_argument('bagfiles', type=argparse.FileType('r'), nargs='*', default=[], help='Bagfiles to load')
+        group.add_argument('--message-cache-size', type=int, metavar='MB', help='Size of the message cache shared by all timelines in megabytes (default: 256)')
+        group.add_argument('--chunk-cache-size', type=int, metavar='MB', help='Size of the cache of decompressed bag chunks shared by all timelines in megabytes (default: 64)')
+        group.add_argument('--clock', action='store_true', help='Publish the playhead to /clock, for nodes using simulated time')
+        group.add_argument('--clock-frequency', type=float, metavar='HZ', help='Frequency of publishing /clock (default: 100)')
+        group.add_argument('--no-mmap', action='store_true', help='Read bag files without memory mapping them')
 
     def shutdown_plugin(self):
         pass
@@ -0,0 +1,172 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import threading
+
+
+class BagCache(object):
+    """
+    LRU cache of data read from bag files, keyed by bag and position in the bag.
+
+    Items are keyed by the bag object rather than its filename, so a file which is written again at the same path and
+    reopened never hits the items of the old file. The items of a bag should be removed when it's closed.
+
+    Each item has a size in bytes given when it's added. Once the cached items exceed the byte budget, the least
+    recently used ones are evicted. Counts cache hits and misses. Thread-safe.
+
+    The process has two of these: the message cache, holding deserialized messages sized by their serialized length,
+    and the chunk cache, holding decompressed chunks.
+    """
+    def __init__(self, byte_budget):
+        """
+        :param byte_budget: maximum total size of the cached items, ''int''
+        """
+        self._lock = threading.Lock()
+        self._byte_budget = byte_budget
+        self._items = collections.OrderedDict()  # (bag, position) -> (value, size), least recently used first
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def nbytes(self):
+        """
+        :returns: total size of the cached items, ''int''
+        """
+        return self._nbytes
+
+    # property: byte_budget
+    def _get_byte_budget(self):
+        return self._byte_budget
+
+    def _set_byte_budget(self, byte_budget):
+        with self._lock:
+            self._byte_budget = byte_budget
+            self._evict()
+
+    byte_budget = property(_get_byte_budget, _set_byte_budget)
+
+    def get(self, bag, position):
+        """
+        Looks up an item and marks it as most recently used.
+        :param bag: bag the item was read from, ''rosbag.bag''
+        :param position: position of the item in the bag
+        :returns: the cached value, or None if it isn't cached
+        """
+        key = (bag, position)
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items[key] = item
+            self.hits += 1
+            return item[0]
+
+    def contains(self, bag, position):
+        """
+        Checks for an item without counting a hit or miss or changing its recency.
+        """
+        with self._lock:
+            return (bag, position) in self._items
+
+    def put(self, bag, position, value, size):
+        """
+        Adds an item as most recently used, evicting the least recently used items to stay within the byte budget.
+        :param bag: bag the item was read from, ''rosbag.bag''
+        :param position: position of the item in the bag
+        :param value: the value to cache
+        :param size: size of the item in bytes, ''int''
+        """
+        key = (bag, position)
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._nbytes -= item[1]
+            if size > self._byte_budget:
+                return
+            self._items[key] = (value, size)
+            self._nbytes += size
+            self._evict()
+
+    def remove_bag(self, bag):
+        """
+        Removes all items of a bag, e.g. when it's closed.
+        :param bag: the bag, ''rosbag.bag''
+        """
+        with self._lock:
+            for key in [key for key in self._items if key[0] is bag]:
+                _, size = self._items.pop(key)
+                self._nbytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self):
+        while self._nbytes > self._byte_budget:
+            _, (_, size) = self._items.popitem(last=False)
+            self._nbytes -= size
+
+
+_message_cache = None
+_chunk_cache = None
+_caches_lock = threading.Lock()
+
+
+def get_message_cache():
+    """
+    :returns: cache of deserialized messages shared by all timelines in the process, 256 MB by default, ''BagCache''
+    """
+    global _message_cache
+    with _caches_lock:
+        if _message_cache is None:
+            _message_cache = BagCache(256 * 1024 * 1024)
+        return _message_cache
+
+
+def get_chunk_cache():
+    """
+    :returns: cache of decompressed bag chunks shared by all timelines in the process, 64 MB by default, ''BagCache''
+    """
+    global _chunk_cache
+    with _caches_lock:
+        if _chunk_cache is None:
+            _chunk_cache = BagCache(64 * 1024 * 1024)
+        return _chunk_cache
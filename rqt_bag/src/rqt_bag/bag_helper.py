@@ -34,7 +34,14 @@
 Helper functions for bag files and timestamps.
 """
 
+import bisect
+from itertools import imap, islice
+from operator import attrgetter
+import os
+import threading
 import time
+
+import numpy
 import rospy
 
 
@@ -53,6 +60,34 @@ def stamp_to_str(t):
         return time.strftime('%b %d %Y %H:%M:%S', time.localtime(t_sec)) + '.%03d' % (t.nsecs / 1000000)
 
 
+def get_bag_path(bag):
+    """
+    Get the canonical path of the bag file.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @return: absolute path with symbolic links resolved
+    @rtype:  str
+    """
+    path = os.path.realpath(bag.filename)
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return path
+
+
+def get_bag_stat(bag):
+    """
+    Get the size and modification time of the bag file.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @return: size in bytes and modification time in seconds
+    @rtype:  (int, float)
+    """
+    st = os.stat(bag.filename)
+    return st.st_size, st.st_mtime
+
+
 def get_topics(bag):
     """
     Get an alphabetical list of all the unique topics in the bag.
@@ -125,3 +160,146 @@ def get_datatype(bag, topic):
         return c.datatype
 
     return None
+
+
+def get_connection_stamps(bag, connection_id):
+    """
+    Get the timestamps of the messages on a connection directly from the connection index of the bag.
+
+    The index entries are read in bulk, without creating an entry generator or calling to_sec on each
+    timestamp. Equivalent to [entry.time.to_sec() for entry in bag._connection_indexes[connection_id]].
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param connection_id: id of the connection
+    @type  connection_id: int
+    @return: sorted timestamps in seconds
+    @rtype:  numpy.ndarray of float64
+    """
+    index = bag._connection_indexes.get(connection_id, [])
+    count = len(index)
+    times = list(imap(attrgetter('time'), index))
+    secs = numpy.fromiter(imap(attrgetter('secs'), times), dtype=numpy.int64, count=count)
+    nsecs = numpy.fromiter(imap(attrgetter('nsecs'), times), dtype=numpy.int64, count=count)
+
+    # Same operations as rospy.Time.to_sec, so the stamps are identical
+    return secs.astype(numpy.float64) + nsecs / 1e9
+
+
+def get_connection_positions(bag, connection_id):
+    """
+    Get the positions of the messages on a connection directly from the connection index of the bag.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param connection_id: id of the connection
+    @type  connection_id: int
+    @return: chunk positions and offsets in the chunks of the messages, in index order. For bags without chunks, the
+             positions of the messages and offsets of -1.
+    @rtype:  (numpy.ndarray of int64, numpy.ndarray of int64)
+    """
+    index = bag._connection_indexes.get(connection_id, [])
+    count = len(index)
+    if bag.version != 200:
+        positions = numpy.fromiter(imap(attrgetter('position'), index), dtype=numpy.int64, count=count)
+        return positions, numpy.full(count, -1, dtype=numpy.int64)
+    chunk_positions = numpy.fromiter(imap(attrgetter('chunk_pos'), index), dtype=numpy.int64, count=count)
+    offsets = numpy.fromiter(imap(attrgetter('offset'), index), dtype=numpy.int64, count=count)
+    return chunk_positions, offsets
+
+
+def get_topic_stamps(bag, topic):
+    """
+    Get the timestamps of all messages on a topic, merged across the connections of the topic.
+
+    Equivalent to the timestamps of bag._get_entries(bag._get_connections(topic)).
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param topic: topic name
+    @type  topic: str
+    @return: sorted timestamps in seconds
+    @rtype:  numpy.ndarray of float64
+    """
+    connection_stamps = [get_connection_stamps(bag, c.id) for c in bag._get_connections(topic)]
+    connection_stamps = [stamps for stamps in connection_stamps if len(stamps) > 0]
+    if len(connection_stamps) == 0:
+        return numpy.empty(0, dtype=numpy.float64)
+    elif len(connection_stamps) == 1:
+        return connection_stamps[0]
+    return numpy.sort(numpy.concatenate(connection_stamps), kind='mergesort')
+
+
+def get_connection_entries(bag, connection_id, start_stamp, end_stamp):
+    """
+    Get the index entries of a connection between two stamps from the in-memory connection index of the bag.
+    The entries are located by bisection, without reading the bag file.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param connection_id: connection id
+    @type  connection_id: int
+    @param start_stamp: earliest stamp to include
+    @type  start_stamp: rospy.Time
+    @param end_stamp: latest stamp to include
+    @type  end_stamp: rospy.Time
+    @return: number of entries and an iterator over them in time order
+    @rtype:  (int, iterator)
+    """
+    index = bag._connection_indexes[connection_id]
+    start_index = bisect.bisect_left(_EntryTimes(index), start_stamp)
+    end_index = bisect.bisect_right(_EntryTimes(index), end_stamp)
+    return max(0, end_index - start_index), islice(index, start_index, end_index)
+
+
+def get_chunk_position(position):
+    """
+    Get the position of the chunk holding a message.
+
+    @param position: position of the message in the bag
+    @return: position of the chunk, or None for bags without chunks
+    @rtype:  int
+    """
+    if isinstance(position, tuple):
+        return position[0]
+    return None
+
+
+_raw_message_classes = {}  # (datatype, md5sum) -> raw message class
+_raw_message_classes_lock = threading.Lock()
+
+
+def get_raw_message_class(datatype, md5sum, msg_def):
+    """
+    Get a message class for publishing, subscribing to or writing serialized data as a message of the given type.
+
+    @param datatype: message typename, e.g. sensor_msgs/Image
+    @type  datatype: str
+    @param md5sum: md5sum of the message type
+    @type  md5sum: str
+    @param msg_def: full message definition
+    @type  msg_def: str
+    @return: subclass of rospy.AnyMsg with the type, md5sum and definition of the message type
+    @rtype:  type
+    """
+    key = (datatype, md5sum)
+    with _raw_message_classes_lock:
+        msg_class = _raw_message_classes.get(key)
+        if msg_class is None:
+            msg_class = type(str('Raw_' + datatype.replace('/', '_')), (rospy.AnyMsg,), {'_type': datatype, '_md5sum': md5sum, '_full_text': msg_def})
+            _raw_message_classes[key] = msg_class
+        return msg_class
+
+
+class _EntryTimes(object):
+    """
+    Sequence of the times of index entries, for bisecting an index by time.
+    """
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        return self._index[i].time
@@ -0,0 +1,238 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import bz2
+import mmap
+import struct
+import threading
+
+import rospy
+
+from .bag_cache import get_chunk_cache
+
+try:
+    import roslz4
+except ImportError:
+    roslz4 = None
+
+_OP_MSG_DATA = chr(0x02)
+_OP_CHUNK = chr(0x05)
+_OP_CONNECTION = chr(0x07)
+
+_UINT32 = struct.Struct('<I')
+_TIME = struct.Struct('<II')
+
+# Generating message classes isn't thread-safe
+_message_type_lock = threading.Lock()
+
+
+class BagReader(object):
+    """
+    Reads messages from a bag file without locking the bag, so messages can be read concurrently.
+
+    Each thread reads through its own file handle. Decompressed chunks are kept in a chunk cache shared by all
+    threads, so reads within a recently used chunk don't read or decompress it again.
+    Only supports bags in the 2.0 format which are open for reading.
+    """
+    def __init__(self, bag, chunk_cache=None):
+        """
+        :param bag: the bag to read, ''rosbag.bag''
+        :param chunk_cache: cache of decompressed chunks, defaults to the cache shared by the process, ''BagCache''
+        """
+        self.bag = bag
+        self._chunk_cache = chunk_cache if chunk_cache is not None else get_chunk_cache()
+        self._local = threading.local()
+        self._files_lock = threading.Lock()
+        self._files = []  # file handles of all threads
+
+    @staticmethod
+    def supports(bag):
+        """
+        :returns: True if the bag can be read by a BagReader, ''bool''
+        """
+        return bag.mode == 'r' and bag.version == 200
+
+    def read_message(self, position, raw=False):
+        """
+        :param position: position of the message in the bag, ''(int, int)''
+        :param raw: if True, return the serialized message, ''bool''
+        :returns: topic, message and stamp, as read by rosbag.Bag._read_message, ''(str, msg, rospy.Time)''
+        """
+        chunk_pos, offset = position
+        chunk_data, data_offset = self._read_chunk(chunk_pos)
+        return self._read_message_data(chunk_data, data_offset + offset, position, raw)
+
+    def read_messages(self, positions, raw=False):
+        return [self.read_message(position, raw) for position in positions]
+
+    def close(self):
+        with self._files_lock:
+            for f in self._files:
+                f.close()
+            self._files = []
+
+    def _get_file(self):
+        f = getattr(self._local, 'file', None)
+        if f is None:
+            f = open(self.bag.filename, 'rb')
+            self._local.file = f
+            with self._files_lock:
+                self._files.append(f)
+        return f
+
+    def _read_chunk(self, chunk_pos):
+        """
+        :returns: buffer holding the decompressed data of the chunk and the offset of the data in it, ''(str, int)''
+        """
+        chunk_data = self._chunk_cache.get(self.bag, chunk_pos)
+        if chunk_data is None:
+            chunk_data = self._read_chunk_data(chunk_pos)
+            self._chunk_cache.put(self.bag, chunk_pos, chunk_data, len(chunk_data))
+        return chunk_data, 0
+
+    def _read_chunk_data(self, chunk_pos):
+        """
+        :returns: the decompressed data of the chunk, ''str''
+        """
+        f = self._get_file()
+        f.seek(chunk_pos)
+        (header_length,) = _UINT32.unpack(f.read(4))
+        header = _parse_header(f.read(header_length))
+        if header.get('op') != _OP_CHUNK:
+            raise ValueError('Expected a chunk record at position %d' % chunk_pos)
+        (data_length,) = _UINT32.unpack(f.read(4))
+        return decompress_chunk(header['compression'], f.read(data_length))
+
+    def _read_message_data(self, chunk_data, offset, position, raw):
+        # Skip any connection records before the message data record
+        while True:
+            (header_length,) = _UINT32.unpack_from(chunk_data, offset)
+            offset += 4
+            header = _parse_header(chunk_data[offset:offset + header_length])
+            offset += header_length
+            (data_length,) = _UINT32.unpack_from(chunk_data, offset)
+            offset += 4
+            if header.get('op') != _OP_CONNECTION:
+                break
+            offset += data_length
+
+        if header.get('op') != _OP_MSG_DATA:
+            raise ValueError('Expected a message data record at position %s' % str(position))
+
+        (connection_id,) = _UINT32.unpack(header['conn'])
+        secs, nsecs = _TIME.unpack(header['time'])
+        data = chunk_data[offset:offset + data_length]
+
+        connection = self.bag._connections[connection_id]
+        with _message_type_lock:
+            pytype = self.bag._get_message_type(connection)
+
+        if raw:
+            msg = (connection.datatype, data, connection.md5sum, position, pytype)
+        else:
+            msg = pytype()
+            msg.deserialize(data)
+
+        return connection.topic, msg, rospy.Time(secs, nsecs)
+
+
+class MmapBagReader(BagReader):
+    """
+    Reads messages from a read-only memory mapping of the bag file, shared by all threads.
+
+    Messages in uncompressed chunks are sliced straight from the mapping, without seeking or reading the file.
+    Compressed chunks are decompressed from the mapping into the chunk cache.
+    """
+    def __init__(self, bag, chunk_cache=None):
+        """
+        :param bag: the bag to read, ''rosbag.bag''
+        :param chunk_cache: cache of decompressed chunks, defaults to the cache shared by the process, ''BagCache''
+        :raises: if the bag file can't be mapped, ''EnvironmentError'', ''ValueError'' or ''OverflowError''
+        """
+        super(MmapBagReader, self).__init__(bag, chunk_cache)
+        with open(bag.filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._map.close()
+        super(MmapBagReader, self).close()
+
+    def _read_chunk(self, chunk_pos):
+        (header_length,) = _UINT32.unpack_from(self._map, chunk_pos)
+        header_pos = chunk_pos + 4
+        header = _parse_header(self._map[header_pos:header_pos + header_length])
+        if header.get('op') != _OP_CHUNK:
+            raise ValueError('Expected a chunk record at position %d' % chunk_pos)
+        (data_length,) = _UINT32.unpack_from(self._map, header_pos + header_length)
+        data_pos = header_pos + header_length + 4
+
+        compression = header['compression']
+        if compression == 'none':
+            return self._map, data_pos
+
+        chunk_data = self._chunk_cache.get(self.bag, chunk_pos)
+        if chunk_data is None:
+            chunk_data = decompress_chunk(compression, self._map[data_pos:data_pos + data_length])
+            self._chunk_cache.put(self.bag, chunk_pos, chunk_data, len(chunk_data))
+        return chunk_data, 0
+
+
+def decompress_chunk(compression, data):
+    """
+    :param compression: compression of the chunk, ''str''
+    :param data: the compressed chunk data, ''str''
+    :returns: the decompressed chunk data, ''str''
+    """
+    if compression == 'none':
+        return data
+    elif compression == 'bz2':
+        return bz2.decompress(data)
+    elif compression == 'lz4' and roslz4 is not None:
+        return roslz4.decompress(data)
+    raise ValueError('Unsupported chunk compression: %s' % compression)
+
+
+def _parse_header(header):
+    """
+    :param header: a record header, a sequence of length-prefixed name=value fields, ''str''
+    :returns: the header fields, ''dict(str, str)''
+    """
+    fields = {}
+    offset = 0
+    while offset < len(header):
+        (field_length,) = _UINT32.unpack_from(header, offset)
+        offset += 4
+        name, _, value = header[offset:offset + field_length].partition('=')
+        fields[name] = value
+        offset += field_length
+    return fields
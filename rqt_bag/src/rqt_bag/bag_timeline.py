@@ -32,19 +32,26 @@
 
 import rospy
 import rosbag
+import heapq
 import time
 import threading
 
+import numpy
+
 
 from python_qt_binding.QtCore import Qt, QTimer, qWarning, Signal
 from python_qt_binding.QtGui import QGraphicsScene, QMessageBox
 
 import bag_helper
+import index_cache_file
 
+from .bag_cache import get_chunk_cache, get_message_cache
+from .bag_reader import BagReader, MmapBagReader
+from .clock_publisher import ClockPublisher
 from .timeline_frame import TimelineFrame
-from .message_listener_thread import MessageListenerThread
-from .message_loader_thread import MessageLoaderThread
+from .message_loader import MessageLoader
 from .player import Player
+from .position_index import PositionIndex
 from .recorder import Recorder
 from .timeline_menu import TimelinePopupMenu
 
@@ -62,7 +69,10 @@ class BagTimeline(QGraphicsScene):
         """
         super(BagTimeline, self).__init__()
         self._bags = []
-        self._bag_lock = threading.RLock()
+        self._bag_locks = {}  # bag -> lock serializing access to the bag
+        self._bag_readers = {}  # bag -> BagReader for bags which can be read concurrently
+        self._bag_indexes = {}  # bag -> BagStampIndex, for bags opened for reading
+        self._position_indexes = {}  # topic -> PositionIndex
 
         self.background_task = None  # Display string
         self.background_task_cancel = False
@@ -73,13 +83,10 @@ class BagTimeline(QGraphicsScene):
         self._min_play_speed = 1.0 / 1024.0  # slowest X play speed
         self._play_speed = 0.0
         self._play_all = False
-        self._playhead_positions_cvs = {}
-        self._playhead_positions = {}  # topic -> (bag, position)
-        self._message_loaders = {}
-        self._messages_cvs = {}
-        self._messages = {}  # topic -> (bag, msg_data)
-        self._message_listener_threads = {}  # listener -> MessageListenerThread
+        self._message_loader = MessageLoader(self)
         self._player = False
+        self._clock_publisher = None
+        self.clock_frequency = 100.0  # Hz
         self._recorder = None
         self.last_frame = None
         self.last_playhead = None
@@ -102,6 +109,7 @@ class BagTimeline(QGraphicsScene):
         self.addItem(self._timeline_frame)
 
         self.background_progress = 0
+        self.background_status = ''  # progress bar text of the background task
 
     def get_context(self):
         """
@@ -115,37 +123,50 @@ class BagTimeline(QGraphicsScene):
         """
         for topic in self._get_topics():
             self.stop_publishing(topic)
-            self._message_loaders[topic].stop()
+        self._message_loader.stop()
         if self._player:
             self._player.stop()
+        self.stop_publishing_clock()
         if self._recorder:
             self._recorder.stop()
         if self.background_task is not None:
             self.background_task_cancel = True
         self._timeline_frame.handle_close()
+        for reader in self._bag_readers.values():
+            reader.close()
         for bag in self._bags:
+            get_message_cache().remove_bag(bag)
+            get_chunk_cache().remove_bag(bag)
             bag.close()
         for _, frame in self._views:
             self._context.remove_widget(frame)
 
     # Bag Management and access
-    def add_bag(self, bag):
+    def add_bag(self, bag, use_mmap=False):
         """
-        creates an indexing thread for each new topic in the bag
         fixes the boarders and notifies the indexing thread to index the new items bags
         :param bag: ros bag file, ''rosbag.bag''
+        :param use_mmap: if True, read messages from a memory mapping of the bag file if it can be mapped, ''bool''
         """
+        # Reuse the timestamp index written when the bag was last opened
+        if bag.mode == 'r':
+            self._bag_indexes[bag] = index_cache_file.BagStampIndex(bag)
+
+        self._bag_locks.setdefault(bag, threading.RLock())
+        if BagReader.supports(bag):
+            reader = None
+            if use_mmap:
+                try:
+                    reader = MmapBagReader(bag)
+                except (EnvironmentError, ValueError, OverflowError) as ex:
+                    qWarning('Error mapping bag file [%s], reading it without mapping: %s' % (bag.filename, str(ex)))
+            self._bag_readers[bag] = reader or BagReader(bag)
+
         self._bags.append(bag)
+        self._position_indexes = {}
 
         bag_topics = bag_helper.get_topics(bag)
 
-        new_topics = set(bag_topics) - set(self._timeline_frame.topics)
-
-        for topic in new_topics:
-            self._playhead_positions_cvs[topic] = threading.Condition()
-            self._messages_cvs[topic] = threading.Condition()
-            self._message_loaders[topic] = MessageLoaderThread(self, topic)
-
         self._timeline_frame._start_stamp = self._get_start_stamp()
         self._timeline_frame._end_stamp = self._get_end_stamp()
         self._timeline_frame.topics = self._get_topics()
@@ -168,61 +189,101 @@ class BagTimeline(QGraphicsScene):
         """
         :return: first stamp in the bags, ''rospy.Time''
         """
-        with self._bag_lock:
-            start_stamp = None
-            for bag in self._bags:
+        start_stamp = None
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
                 bag_start_stamp = bag_helper.get_start_stamp(bag)
-                if bag_start_stamp is not None and (start_stamp is None or bag_start_stamp < start_stamp):
-                    start_stamp = bag_start_stamp
-            return start_stamp
+            if bag_start_stamp is not None and (start_stamp is None or bag_start_stamp < start_stamp):
+                start_stamp = bag_start_stamp
+        return start_stamp
 
     def _get_end_stamp(self):
         """
         :return: last stamp in the bags, ''rospy.Time''
         """
-        with self._bag_lock:
-            end_stamp = None
-            for bag in self._bags:
+        end_stamp = None
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
                 bag_end_stamp = bag_helper.get_end_stamp(bag)
-                if bag_end_stamp is not None and (end_stamp is None or bag_end_stamp > end_stamp):
-                    end_stamp = bag_end_stamp
-            return end_stamp
+            if bag_end_stamp is not None and (end_stamp is None or bag_end_stamp > end_stamp):
+                end_stamp = bag_end_stamp
+        return end_stamp
 
     def _get_topics(self):
         """
         :return: sorted list of topic names, ''list(str)''
         """
-        with self._bag_lock:
-            topics = set()
-            for bag in self._bags:
-                for topic in bag_helper.get_topics(bag):
-                    topics.add(topic)
-            return sorted(topics)
+        topics = set()
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
+                topics.update(bag_helper.get_topics(bag))
+        return sorted(topics)
 
     def _get_topics_by_datatype(self):
         """
         :return: dict of list of topics for each datatype, ''dict(datatype:list(topic))''
         """
-        with self._bag_lock:
-            topics_by_datatype = {}
-            for bag in self._bags:
-                for datatype, topics in bag_helper.get_topics_by_datatype(bag).items():
-                    topics_by_datatype.setdefault(datatype, []).extend(topics)
-            return topics_by_datatype
+        topics_by_datatype = {}
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
+                bag_topics_by_datatype = bag_helper.get_topics_by_datatype(bag)
+            for datatype, topics in bag_topics_by_datatype.items():
+                topics_by_datatype.setdefault(datatype, []).extend(topics)
+        return topics_by_datatype
 
     def get_datatype(self, topic):
         """
         :return: datatype associated with a topic, ''str''
         :raises: if there are multiple datatypes assigned to a single topic, ''Exception''
         """
-        with self._bag_lock:
-            datatype = None
-            for bag in self._bags:
+        datatype = None
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
                 bag_datatype = bag_helper.get_datatype(bag, topic)
-                if datatype and bag_datatype and (bag_datatype != datatype):
-                    raise Exception('topic %s has multiple datatypes: %s and %s' % (topic, datatype, bag_datatype))
-                datatype = bag_datatype
-            return datatype
+            if datatype and bag_datatype and (bag_datatype != datatype):
+                raise Exception('topic %s has multiple datatypes: %s and %s' % (topic, datatype, bag_datatype))
+            datatype = bag_datatype
+        return datatype
+
+    def get_bag_stamps(self, bag, topic):
+        """
+        Access the timestamp index of a topic in a bag, building it if it hasn't been loaded.
+        Once all topics of the bag are indexed, the index is saved to disk.
+        Doesn't lock the bag, so topics can be indexed concurrently.
+        :param bag: ros bag file, ''rosbag.bag''
+        :param topic: the topic to be accessed, ''str''
+        :returns: sorted timestamps in seconds, empty if the bag doesn't have the topic, or None for a bag being recorded, ''numpy.array''
+        """
+        bag_index = self._bag_indexes.get(bag)
+        if bag_index is None:
+            return None
+
+        stamps = bag_index.get_stamps(topic)
+        try:
+            bag_index.save_if_complete()
+        except (IOError, OSError) as ex:
+            qWarning('Error saving index for bag file [%s]: %s' % (bag.filename, str(ex)))
+
+        return stamps
+
+    def get_stamps(self, topic):
+        """
+        :param topic: the topic to be accessed, ''str''
+        :returns: sorted timestamps in seconds of the messages on the topic in all bags, or None if a bag has no index, ''numpy.array''
+        """
+        topic_stamps = []
+        for bag in list(self._bags):
+            stamps = self.get_bag_stamps(bag, topic)
+            if stamps is None:
+                return None
+            topic_stamps.append(stamps)
+
+        topic_stamps = [stamps for stamps in topic_stamps if len(stamps) > 0]
+        if len(topic_stamps) == 0:
+            return numpy.empty(0, dtype=numpy.float64)
+        elif len(topic_stamps) == 1:
+            return topic_stamps[0]
+        return numpy.sort(numpy.concatenate(topic_stamps), kind='mergesort')
 
     def get_entries(self, topics, start_stamp, end_stamp):
         """
@@ -232,23 +293,8 @@ class BagTimeline(QGraphicsScene):
         :param end_stamp: stamp to end at, ''rospy,Time''
         :returns: entries the bag file, ''msg''
         """
-        with self._bag_lock:
-            from rosbag import bag  # for _mergesort
-            bag_entries = []
-            for b in self._bags:
-                bag_start_time = bag_helper.get_start_stamp(b)
-                if bag_start_time is not None and bag_start_time > end_stamp:
-                    continue
-
-                bag_end_time = bag_helper.get_end_stamp(b)
-                if bag_end_time is not None and bag_end_time < start_stamp:
-                    continue
-
-                connections = list(b._get_connections(topics))
-                bag_entries.append(b._get_entries(connections, start_stamp, end_stamp))
-
-            for entry, _ in bag._mergesort(bag_entries, key=lambda entry: entry.time):
-                yield entry
+        for _, entry in self._get_entries_with_bags(topics, start_stamp, end_stamp):
+            yield entry
 
     def get_entries_with_bags(self, topic, start_stamp, end_stamp):
         """
@@ -258,12 +304,24 @@ class BagTimeline(QGraphicsScene):
         :param end_stamp: stamp to end at, ''rospy,Time''
         :returns: tuple of (bag, entry) for the entries in the bag file, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            from rosbag import bag  # for _mergesort
+        return self._get_entries_with_bags(topic, start_stamp, end_stamp)
 
-            bag_entries = []
-            bag_by_iter = {}
-            for b in self._bags:
+    def _get_entries_with_bags(self, topics, start_stamp, end_stamp):
+        """
+        Merges the entries of all bags in time order.
+        Each bag is only locked while its next entry is found, so other threads can access the bags between entries.
+        :param topics: topic or list of topics to query, ''str'' or ''list(str)''
+        :param start_stamp: stamp to start at, ''rospy.Time''
+        :param end_stamp: stamp to end at, ''rospy,Time''
+        :returns: tuple of (bag, entry) for the entries in the bag file, ''(rosbag.bag, msg)''
+        """
+        from rosbag import bag  # for _mergesort
+
+        bag_entries = []
+        bag_by_iter = {}
+        for b in list(self._bags):
+            lock = self._bag_locks[b]
+            with lock:
                 bag_start_time = bag_helper.get_start_stamp(b)
                 if bag_start_time is not None and bag_start_time > end_stamp:
                     continue
@@ -272,13 +330,13 @@ class BagTimeline(QGraphicsScene):
                 if bag_end_time is not None and bag_end_time < start_stamp:
                     continue
 
-                connections = list(b._get_connections(topic))
-                it = iter(b._get_entries(connections, start_stamp, end_stamp))
-                bag_by_iter[it] = b
-                bag_entries.append(it)
+                connections = list(b._get_connections(topics))
+            it = _iter_locked(lock, b._get_entries(connections, start_stamp, end_stamp))
+            bag_by_iter[it] = b
+            bag_entries.append(it)
 
-            for entry, it in bag._mergesort(bag_entries, key=lambda entry: entry.time):
-                yield bag_by_iter[it], entry
+        for entry, it in bag._mergesort(bag_entries, key=lambda entry: entry.time):
+            yield bag_by_iter[it], entry
 
     def get_entry(self, t, topic):
         """
@@ -287,14 +345,73 @@ class BagTimeline(QGraphicsScene):
         :param topic: the topic to be accessed, ''str''
         :return: tuple of (bag, entry) corisponding to time t and topic, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            entry_bag, entry = None, None
-            for bag in self._bags:
+        entry_bag, entry = None, None
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
                 bag_entry = bag._get_entry(t, bag._get_connections(topic))
-                if bag_entry and (not entry or bag_entry.time > entry.time):
-                    entry_bag, entry = bag, bag_entry
+            if bag_entry and (not entry or bag_entry.time > entry.time):
+                entry_bag, entry = bag, bag_entry
+
+        return entry_bag, entry
+
+    def get_position_index(self, topic):
+        """
+        Access the position index of a topic. If it isn't built yet, it's built on the index cache thread.
+        :param topic: the topic to be accessed, ''str''
+        :returns: positions of the messages on the topic in all bags, or None while it's being built or a bag is being recorded, ''PositionIndex''
+        """
+        position_index = self._position_indexes.get(topic)
+        if position_index is None and all(bag.mode == 'r' for bag in list(self._bags)):
+            with self._timeline_frame.index_cache_cv:
+                if topic not in self._timeline_frame.invalidated_position_indexes:
+                    self._timeline_frame.invalidated_position_indexes.add(topic)
+                    self._timeline_frame.index_cache_cv.notify()
+        return position_index
+
+    def build_position_index(self, topic):
+        """
+        Builds the position index of a topic from the connection indexes of the bags. Called on the index cache thread.
+        :param topic: the topic to be indexed, ''str''
+        """
+        bags = list(self._bags)
+        if any(bag.mode != 'r' for bag in bags):
+            return
+
+        stamps, bag_numbers, chunk_positions, offsets = [], [], [], []
+        for bag_number, bag in enumerate(bags):
+            with self._bag_locks[bag]:
+                connections = list(bag._get_connections(topic))
+                for connection in connections:
+                    connection_stamps = bag_helper.get_connection_stamps(bag, connection.id)
+                    connection_chunk_positions, connection_offsets = bag_helper.get_connection_positions(bag, connection.id)
+                    stamps.append(connection_stamps)
+                    bag_numbers.append(numpy.full(len(connection_stamps), bag_number, dtype=numpy.int64))
+                    chunk_positions.append(connection_chunk_positions)
+                    offsets.append(connection_offsets)
+        if stamps:
+            position_index = PositionIndex(numpy.concatenate(stamps), numpy.concatenate(bag_numbers), numpy.concatenate(chunk_positions), numpy.concatenate(offsets), bags)
+        else:
+            position_index = PositionIndex([], [], [], [], bags)
+
+        # Bags were added while building; the index is built again on the next request
+        if len(self._bags) == len(bags):
+            self._position_indexes[topic] = position_index
+
+    def get_position(self, t, topic):
+        """
+        Looks up the message on a topic at a time, using the position index of the topic where possible.
+        :param t: time, ''rospy.Time''
+        :param topic: the topic to be accessed, ''str''
+        :returns: bag and position of the last message on the topic at or before t, or (None, None), ''(rosbag.bag, position)''
+        """
+        position_index = self.get_position_index(topic)
+        if position_index is not None:
+            return position_index.lookup(t.to_sec())
 
-            return entry_bag, entry
+        bag, entry = self.get_entry(t, topic)
+        if not entry:
+            return None, None
+        return bag, entry.position
 
     def get_entry_after(self, t):
         """
@@ -302,14 +419,14 @@ class BagTimeline(QGraphicsScene):
         :param t: time, ''rospy.Time''
         :return: tuple of (bag, entry) corisponding to time t, ''(rosbag.bag, msg)''
         """
-        with self._bag_lock:
-            entry_bag, entry = None, None
-            for bag in self._bags:
+        entry_bag, entry = None, None
+        for bag in list(self._bags):
+            with self._bag_locks[bag]:
                 bag_entry = bag._get_entry_after(t, bag._get_connections())
-                if bag_entry and (not entry or bag_entry.time < entry.time):
-                    entry_bag, entry = bag, bag_entry
+            if bag_entry and (not entry or bag_entry.time < entry.time):
+                entry_bag, entry = bag, bag_entry
 
-            return entry_bag, entry
+        return entry_bag, entry
 
     def get_next_message_time(self):
         """
@@ -342,91 +459,168 @@ class BagTimeline(QGraphicsScene):
     def stop_background_task(self):
         self.background_task = None
 
-    def copy_region_to_bag(self, filename):
+    def copy_region_to_bag(self, filename, topics=None, max_rates=None, compression=rosbag.Compression.NONE):
+        """
+        Saves the play region to a new bag file
+        :param filename: filesystem path to write to, ''str''
+        :param topics: topics to write to the file, defaults to all topics, ''list(str)''
+        :param max_rates: maximum rate in Hz of each limited topic, other topics are written at full rate, ''dict(str, float)''
+        :param compression: compression of the new bag file, ''str''
+        """
         if len(self._bags) > 0:
-            self._export_region(filename, self._timeline_frame.topics, self._timeline_frame.play_region[0], self._timeline_frame.play_region[1])
+            if topics is None:
+                topics = self._timeline_frame.topics
+            self._export_region(filename, topics, self._timeline_frame.play_region[0], self._timeline_frame.play_region[1], max_rates, compression)
 
-    def _export_region(self, path, topics, start_stamp, end_stamp):
+    def _export_region(self, path, topics, start_stamp, end_stamp, max_rates=None, compression=rosbag.Compression.NONE):
         """
         Starts a thread to save the current selection to a new bag file
         :param path: filesystem path to write to, ''str''
         :param topics: topics to write to the file, ''list(str)''
         :param start_stamp: start of area to save, ''rospy.Time''
         :param end_stamp: end of area to save, ''rospy.Time''
+        :param max_rates: maximum rate in Hz of each limited topic, ''dict(str, float)''
+        :param compression: compression of the new bag file, ''str''
         """
         if not self.start_background_task('Copying messages to "%s"' % path):
             return
         # TODO implement a status bar area with information on the current save status
-        bag_entries = list(self.get_entries_with_bags(topics, start_stamp, end_stamp))
-
-        if self.background_task_cancel:
-            return
-
-        # Get the total number of messages to copy
-        total_messages = len(bag_entries)
+        total_messages, bag_entries = self._get_export_entries(topics, start_stamp, end_stamp, max_rates or {})
 
         # If no messages, prompt the user and return
         if total_messages == 0:
             QMessageBox(QMessageBox.Warning, 'rqt_bag', 'No messages found', QMessageBox.Ok).exec_()
+            self.stop_background_task()
             return
 
         # Open the path for writing
         try:
-            export_bag = rosbag.Bag(path, 'w')
+            export_bag = rosbag.Bag(path, 'w', compression=compression)
         except Exception:
             QMessageBox(QMessageBox.Warning, 'rqt_bag', 'Error opening bag file [%s] for writing' % path, QMessageBox.Ok).exec_()
+            self.stop_background_task()
+            return
 
         # Run copying in a background thread
-        self._export_thread = threading.Thread(target=self._run_export_region, args=(export_bag, topics, start_stamp, end_stamp, bag_entries))
+        self._export_thread = threading.Thread(target=self._run_export_region, args=(export_bag, total_messages, bag_entries))
         self._export_thread.start()
 
-    def _run_export_region(self, export_bag, topics, start_stamp, end_stamp, bag_entries):
+    def _get_export_entries(self, topics, start_stamp, end_stamp, max_rates):
         """
-        Threaded function that saves the current selection to a new bag file
-        :param export_bag: bagfile to write to, ''rosbag.bag''
-        :param topics: topics to write to the file, ''list(str)''
+        Finds the entries to export by bisecting the in-memory connection indexes of the bags.
+        The entries are streamed in time order, so neither the entries nor the bag locks are held for the whole export.
+        Topics with a maximum rate are decimated from the index, so the skipped messages are never read.
+        :param topics: topics to export, ''list(str)''
         :param start_stamp: start of area to save, ''rospy.Time''
         :param end_stamp: end of area to save, ''rospy.Time''
+        :param max_rates: maximum rate in Hz of each limited topic, ''dict(str, float)''
+        :returns: number of entries and an iterator of (bag, entry) in time order, ''(int, iterator)''
+        """
+        total_entries = 0
+        connection_entries = []
+        for topic in topics:
+            topic_count = 0
+            topic_entries = []
+            for bag in list(self._bags):
+                with self._bag_locks[bag]:
+                    connections = list(bag._get_connections(topic))
+                for connection in connections:
+                    count, entries = bag_helper.get_connection_entries(bag, connection.id, start_stamp, end_stamp)
+                    if count > 0:
+                        topic_count += count
+                        topic_entries.append(_tag_export_entries(len(connection_entries) + len(topic_entries), bag, entries))
+
+            if topic_entries and max_rates.get(topic, 0.0) > 0.0:
+                # Decimate the merged connections of the topic
+                min_interval = rospy.Duration.from_sec(1.0 / max_rates[topic])
+                decimated_entries = list(_decimate_export_entries(heapq.merge(*topic_entries), min_interval))
+                topic_count, topic_entries = len(decimated_entries), [iter(decimated_entries)]
+
+            total_entries += topic_count
+            connection_entries.extend(topic_entries)
+
+        bag_entries = ((bag, entry) for _, _, bag, entry in heapq.merge(*connection_entries))
+        return total_entries, bag_entries
+
+    def _run_export_region(self, export_bag, total_messages, bag_entries):
+        """
+        Threaded function that saves the current selection to a new bag file
+
+        Messages are copied as raw serialized records, without deserializing them. Consecutive messages in the same chunk
+        are read in one batch, so each chunk is read and decompressed once.
+        :param export_bag: bagfile to write to, ''rosbag.bag''
+        :param total_messages: number of messages to write, ''int''
+        :param bag_entries: iterator of (bag, entry) to write in time order, ''iterator''
         """
-        total_messages = len(bag_entries)
-        update_step = max(1, total_messages / 100)
-        message_num = 1
+        message_num = 0
         progress = 0
-        # Write out the messages
-        for bag, entry in bag_entries:
+        bytes_written = 0
+        start_time = time.time()
+        # Write out the messages, one batch per chunk
+        for bag, batch in _batch_export_entries(bag_entries):
             if self.background_task_cancel:
                 break
+            positions = [entry.position for entry in batch]
             try:
-                topic, msg, t = self.read_message(bag, entry.position)
-                export_bag.write(topic, msg, t)
+                for topic, raw_msg, t in self.read_messages(bag, positions, raw=True):
+                    export_bag.write(topic, raw_msg, t, raw=True)
+                    bytes_written += len(raw_msg[1])
             except Exception as ex:
-                qWarning('Error exporting message at position %s: %s' % (str(entry.position), str(ex)))
+                qWarning('Error exporting messages at positions %s - %s: %s' % (str(positions[0]), str(positions[-1]), str(ex)))
                 export_bag.close()
+                self.background_progress = 0
+                self.background_status = ''
                 self.stop_background_task()
                 return
 
-            if message_num % update_step == 0 or message_num == total_messages:
-                new_progress = int(100.0 * (float(message_num) / total_messages))
-                if new_progress != progress:
-                    progress = new_progress
-                    if not self.background_task_cancel:
-                        self.background_progress = progress
-                        self.status_bar_changed_signal.emit()
-
-            message_num += 1
+            message_num += len(positions)
+            new_progress = int(100.0 * (float(message_num) / total_messages))
+            if new_progress != progress:
+                progress = new_progress
+                if not self.background_task_cancel:
+                    self.background_progress = progress
+                    self.background_status = '%%p%%  %.1f MB/s' % (bytes_written / (1024.0 * 1024.0) / max(time.time() - start_time, 1e-3))
+                    self.status_bar_changed_signal.emit()
 
         # Close the bag
         try:
             self.background_progress = 0
+            self.background_status = ''
             self.status_bar_changed_signal.emit()
             export_bag.close()
         except Exception as ex:
             QMessageBox(QMessageBox.Warning, 'rqt_bag', 'Error closing bag file [%s]: %s' % (export_bag.filename, str(ex)), QMessageBox.Ok).exec_()
         self.stop_background_task()
 
-    def read_message(self, bag, position):
-        with self._bag_lock:
-            return bag._read_message(position)
+    def read_message(self, bag, position, raw=False):
+        """
+        Reads a message from a bag. Bags opened for reading are read through a BagReader without locking,
+        so other threads can read the same bag concurrently.
+        :param bag: the bag to read from, ''rosbag.bag''
+        :param position: position of the message in the bag
+        :param raw: if True, return the serialized message, ''bool''
+        :returns: topic, message and stamp, ''(str, msg, rospy.Time)''
+        """
+        reader = self._bag_readers.get(bag)
+        if reader is not None:
+            return reader.read_message(position, raw)
+        with self._bag_locks[bag]:
+            return bag._read_message(position, raw)
+
+    def read_messages(self, bag, positions, raw=False):
+        """
+        Reads several messages from a bag, holding the lock of the bag once if it can't be read concurrently.
+        Reading positions of the same chunk in order lets the chunk be decompressed once.
+        :param bag: the bag to read from, ''rosbag.bag''
+        :param positions: positions of the messages in the bag, ''list''
+        :param raw: if True, return the serialized messages, ''bool''
+        :returns: the messages, ''list''
+        """
+        reader = self._bag_readers.get(bag)
+        if reader is not None:
+            return reader.read_messages(positions, raw)
+        with self._bag_locks[bag]:
+            return [bag._read_message(position, raw) for position in positions]
 
     ### Mouse events
     def on_mouse_down(self, event):
@@ -481,6 +675,44 @@ class BagTimeline(QGraphicsScene):
         self._player.stop_publishing(topic)
         return True
 
+    def is_publishing_clock(self):
+        return self._clock_publisher is not None
+
+    def start_publishing_clock(self):
+        """
+        Starts publishing the playhead to /clock at clock_frequency
+        :returns: True if the clock is being published, ''bool''
+        """
+        if self._clock_publisher is None:
+            try:
+                self._clock_publisher = ClockPublisher(self, self.clock_frequency)
+            except Exception as ex:
+                qWarning('Error starting clock publisher: %s' % str(ex))
+                return False
+
+        return True
+
+    def stop_publishing_clock(self):
+        if self._clock_publisher is not None:
+            self._clock_publisher.stop()
+            self._clock_publisher = None
+
+    def get_publish_rates(self):
+        """
+        :returns: requested and achieved publish rate in Hz of each topic which is being published, ''dict(str, (float, float))''
+        """
+        if not self._player:
+            return {}
+        return self._player.get_publish_rates()
+
+    def get_skipped_counts(self):
+        """
+        :returns: number of messages skipped by playback on each topic which is being published, ''dict(str, int)''
+        """
+        if not self._player:
+            return {}
+        return self._player.get_skipped_counts()
+
     def _create_player(self):
         if not self._player:
             try:
@@ -615,11 +847,14 @@ class BagTimeline(QGraphicsScene):
     ### Recording
 
     def record_bag(self, filename, all=True, topics=[], regex=False, limit=0):
+        # The recorder writes to the bag while holding its lock
+        bag_lock = threading.RLock()
         try:
-            self._recorder = Recorder(filename, bag_lock=self._bag_lock, all=all, topics=topics, regex=regex, limit=limit)
+            self._recorder = Recorder(filename, bag_lock=bag_lock, all=all, topics=topics, regex=regex, limit=limit)
         except Exception, ex:
             qWarning('Error opening bag for recording [%s]: %s' % (filename, str(ex)))
             return
+        self._bag_locks[self._recorder.bag] = bag_lock
 
         self._recorder.add_listener(self._message_recorded)
 
@@ -637,6 +872,14 @@ class BagTimeline(QGraphicsScene):
             self._recorder.toggle_paused()
             self.update()
 
+    def get_dropped_counts(self):
+        """
+        :returns: number of messages dropped by the recorder on each topic because they couldn't be written fast enough, ''dict(str, int)''
+        """
+        if not self._recorder:
+            return {}
+        return self._recorder.get_dropped_counts()
+
     def _message_recorded(self, topic, msg, t):
         if self._timeline_frame._start_stamp is None:
             self._timeline_frame._start_stamp = t
@@ -649,10 +892,6 @@ class BagTimeline(QGraphicsScene):
             self._timeline_frame.topics = self._get_topics()
             self._timeline_frame._topics_by_datatype = self._get_topics_by_datatype()
 
-            self._playhead_positions_cvs[topic] = threading.Condition()
-            self._messages_cvs[topic] = threading.Condition()
-            self._message_loaders[topic] = MessageLoaderThread(self, topic)
-
         if self._timeline_frame._stamp_left is None:
             self.reset_zoom()
 
@@ -683,14 +922,20 @@ class BagTimeline(QGraphicsScene):
     def has_listeners(self, topic):
         return topic in self._listeners
 
+    def get_listened_topics(self):
+        """
+        :returns: the topics with listeners, ''list(str)''
+        """
+        return list(self._listeners.keys())
+
     def add_listener(self, topic, listener):
         self._listeners.setdefault(topic, []).append(listener)
 
-        self._message_listener_threads[(topic, listener)] = MessageListenerThread(self, topic, listener)
-        # Notify the message listeners
-        self._message_loaders[topic].reset()
-        with self._playhead_positions_cvs[topic]:
-            self._playhead_positions_cvs[topic].notify_all()
+        # Post the message at the playhead to the new listener. Positions are only updated for listened topics.
+        playhead = self._timeline_frame.playhead
+        if playhead is not None:
+            self._message_loader.set_playhead_position(topic, self.get_position(playhead, topic))
+        self._message_loader.reset(topic)
 
         self.update()
 
@@ -702,10 +947,7 @@ class BagTimeline(QGraphicsScene):
             if len(topic_listeners) == 0:
                 del self._listeners[topic]
 
-            # Stop the message listener thread
-            if (topic, listener) in self._message_listener_threads:
-                self._message_listener_threads[(topic, listener)].stop()
-                del self._message_listener_threads[(topic, listener)]
+            self._message_loader.remove_listener(topic, listener)
             self.update()
 
     ### Playhead
@@ -770,3 +1012,55 @@ class BagTimeline(QGraphicsScene):
 
     def navigate_end(self):
         self._timeline_frame.playhead = self._timeline_frame.play_region[1]
+
+
+def _iter_locked(lock, iterable):
+    """
+    Iterates while holding the lock only for each step of the iteration.
+    :param lock: lock to hold, ''threading.RLock''
+    :param iterable: the items to iterate over, ''iterable''
+    """
+    it = iter(iterable)
+    while True:
+        with lock:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def _tag_export_entries(order, bag, entries):
+    """
+    Tags the entries of a connection for merging the connections by time, breaking ties by connection order.
+    """
+    for entry in entries:
+        yield entry.time, order, bag, entry
+
+
+def _batch_export_entries(bag_entries, max_batch_size=1000):
+    """
+    Groups consecutive entries of the same bag and chunk into batches of at most max_batch_size entries.
+    :returns: iterator of (bag, entries)
+    """
+    batch_bag, batch_chunk_position, batch = None, None, []
+    for bag, entry in bag_entries:
+        chunk_position = bag_helper.get_chunk_position(entry.position)
+        if batch and (bag is not batch_bag or chunk_position != batch_chunk_position or len(batch) >= max_batch_size):
+            yield batch_bag, batch
+            batch = []
+        batch_bag, batch_chunk_position = bag, chunk_position
+        batch.append(entry)
+    if batch:
+        yield batch_bag, batch
+
+
+def _decimate_export_entries(tagged_entries, min_interval):
+    """
+    Keeps the first entry and every entry at least min_interval after the previously kept one.
+    """
+    next_stamp = None
+    for tagged_entry in tagged_entries:
+        if next_stamp is None or tagged_entry[0] >= next_stamp:
+            next_stamp = tagged_entry[0] + min_interval
+            yield tagged_entry
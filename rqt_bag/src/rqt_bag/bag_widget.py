@@ -38,11 +38,14 @@ import rospkg
 
 from python_qt_binding import loadUi
 from python_qt_binding.QtCore import Qt
-from python_qt_binding.QtGui import QFileDialog, QGraphicsView, QIcon, QWidget
+from python_qt_binding.QtGui import QDialog, QFileDialog, QGraphicsView, QIcon, QWidget
 
 import rosbag
 import bag_helper
 from .bag_timeline import BagTimeline
+from .export_dialog import ExportDialog
+from .bag_cache import get_message_cache
+from .timeline_cache import get_timeline_cache_stats
 
 
 class BagGraphicsView(QGraphicsView):
@@ -68,6 +71,7 @@ class BagWidget(QWidget):
 
         self._timeline = BagTimeline(context)
         self.graphics_view.setScene(self._timeline)
+        self.use_mmap = True  # read loaded bags from a memory mapping of the file
 
         self.graphics_view.resizeEvent = self._resizeEvent
         self.graphics_view.setMouseTracking(True)
@@ -248,12 +252,15 @@ class BagWidget(QWidget):
         self.end_button.setEnabled(True)
         self.save_button.setEnabled(True)
         self.record_button.setEnabled(False)
-        self._timeline.add_bag(bag)
+        self._timeline.add_bag(bag, self.use_mmap)
 
     def _handle_save_clicked(self):
+        export_dialog = ExportDialog(self._timeline._timeline_frame.topics, self)
+        if export_dialog.exec_() != QDialog.Accepted:
+            return
         filename = QFileDialog.getSaveFileName(self, self.tr('Save selected region to file...'), '.', self.tr('Bag files {.bag} (*.bag)'))
         if filename[0] != '':
-            self._timeline.copy_region_to_bag(filename[0])
+            self._timeline.copy_region_to_bag(filename[0], export_dialog.get_topics(), export_dialog.get_max_rates(), export_dialog.get_compression())
 
     def _update_status_bar(self):
         if self._timeline._timeline_frame.playhead is None or self._timeline._timeline_frame.start_stamp is None:
@@ -262,6 +269,8 @@ class BagWidget(QWidget):
         try:
             # Background Process Status
             self.progress_bar.setValue(self._timeline.background_progress)
+            self.progress_bar.setFormat(self._timeline.background_status)
+            self.progress_bar.setTextVisible(bool(self._timeline.background_status))
 
             # Raw timestamp
             self.stamp_label.setText('%.3fs' % self._timeline._timeline_frame.playhead.to_sec())
@@ -290,6 +299,42 @@ class BagWidget(QWidget):
                 self.playspeed_label.setText(spd_str)
             else:
                 self.playspeed_label.setText('')
+
+            # Achieved / requested publish rate
+            publish_rates = self._timeline.get_publish_rates()
+            if publish_rates:
+                skipped_counts = self._timeline.get_skipped_counts()
+                requested = sum(rate[0] for rate in publish_rates.values())
+                achieved = sum(rate[1] for rate in publish_rates.values())
+                skipped = sum(skipped_counts.values())
+                if skipped:
+                    self.publish_rate_label.setText('%.0f / %.0f Hz, %d skipped' % (achieved, requested, skipped))
+                else:
+                    self.publish_rate_label.setText('%.0f / %.0f Hz' % (achieved, requested))
+                self.publish_rate_label.setToolTip('\n'.join('%s: %.1f / %.1f Hz, %d skipped' % (topic, rate[1], rate[0], skipped_counts.get(topic, 0)) for topic, rate in sorted(publish_rates.items())))
+            else:
+                self.publish_rate_label.setText('')
+                self.publish_rate_label.setToolTip('Achieved / requested publish rate')
+
+            # Message cache hits / misses
+            message_cache = get_message_cache()
+            self.cache_label.setText('%d / %d' % (message_cache.hits, message_cache.misses))
+
+            # Timeline cache hit rate / resident size
+            hits, misses, nbytes = get_timeline_cache_stats()
+            if hits + misses > 0:
+                self.timeline_cache_label.setText('%.0f%% / %.1f MB' % (100.0 * hits / (hits + misses), nbytes / (1024.0 * 1024.0)))
+            else:
+                self.timeline_cache_label.setText('')
+
+            # Messages dropped while recording
+            dropped_counts = dict((topic, count) for topic, count in self._timeline.get_dropped_counts().items() if count > 0)
+            if dropped_counts:
+                self.dropped_label.setText('%d dropped' % sum(dropped_counts.values()))
+                self.dropped_label.setToolTip('\n'.join('%s: %d dropped' % (topic, count) for topic, count in sorted(dropped_counts.items())))
+            else:
+                self.dropped_label.setText('')
+                self.dropped_label.setToolTip('Messages dropped while recording')
         except:
             return
     # Shutdown all members
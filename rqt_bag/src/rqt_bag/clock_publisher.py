@@ -0,0 +1,88 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+ClockPublisher publishes the playhead of the timeline as the ROS clock.
+"""
+
+import threading
+import time
+
+import rospy
+
+from rosgraph_msgs.msg import Clock
+
+
+class ClockPublisher(object):
+    """
+    Publishes the playhead time to /clock at a fixed frequency, so nodes using simulated time follow playback.
+
+    The clock follows the playhead, so it stops while playback is paused, jumps when the playhead is moved and runs at
+    the play speed of the timeline.
+    """
+    def __init__(self, timeline, frequency=100.0):
+        """
+        :param timeline: the timeline to publish the playhead of, ''BagTimeline''
+        :param frequency: publish frequency in Hz, ''float''
+        """
+        self.timeline = timeline
+        self.frequency = frequency
+
+        self._publisher = rospy.Publisher('/clock', Clock)
+        self._stop_event = threading.Event()
+
+        self._publish_thread = threading.Thread(target=self._run)
+        self._publish_thread.setDaemon(True)
+        self._publish_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._publisher.unregister()
+
+    def _run(self):
+        clock = Clock()
+        publish_time = time.time()
+        while not self._stop_event.is_set():
+            playhead = self.timeline._timeline_frame.playhead
+            if playhead is not None:
+                clock.clock = playhead
+                try:
+                    self._publisher.publish(clock)
+                except rospy.ROSException:
+                    # The publisher was unregistered meanwhile
+                    return
+
+            # Schedule against the previous publish time so the frequency doesn't drift, skipping missed publishes
+            period = 1.0 / self.frequency
+            now = time.time()
+            publish_time = max(publish_time + period, now)
+            self._stop_event.wait(publish_time - now)
@@ -0,0 +1,118 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import rosbag
+
+from python_qt_binding.QtCore import Qt
+from python_qt_binding.QtGui import QComboBox, QDialog, QDialogButtonBox, QDoubleSpinBox, QHBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QVBoxLayout
+
+
+def get_compressions():
+    """
+    :returns: the compression formats supported by the installed rosbag, ''list(str)''
+    """
+    compressions = [rosbag.Compression.NONE, rosbag.Compression.BZ2]
+    if hasattr(rosbag.Compression, 'LZ4'):
+        compressions.append(rosbag.Compression.LZ4)
+    return compressions
+
+
+class ExportDialog(QDialog):
+    """
+    Dialog choosing the topics, the maximum rate of each topic and the compression of an exported region
+    """
+    def __init__(self, topics, parent=None):
+        """
+        :param topics: topics which can be exported, ''list(str)''
+        :param parent: parent widget, ''QWidget''
+        """
+        super(ExportDialog, self).__init__(parent)
+        self.setWindowTitle('Export Region')
+
+        self._topics = topics
+        self._topic_table = QTableWidget(len(topics), 2, self)
+        self._topic_table.setHorizontalHeaderLabels(['Topic', 'Max Rate (Hz)'])
+        self._topic_table.verticalHeader().hide()
+        self._rate_spin_boxes = []
+        for row, topic in enumerate(topics):
+            topic_item = QTableWidgetItem(topic)
+            topic_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable)
+            topic_item.setCheckState(Qt.Checked)
+            self._topic_table.setItem(row, 0, topic_item)
+
+            # A rate of 0 exports every message
+            rate_spin_box = QDoubleSpinBox(self._topic_table)
+            rate_spin_box.setRange(0.0, 10000.0)
+            rate_spin_box.setSpecialValueText('All messages')
+            self._topic_table.setCellWidget(row, 1, rate_spin_box)
+            self._rate_spin_boxes.append(rate_spin_box)
+        self._topic_table.resizeColumnsToContents()
+        self._topic_table.horizontalHeader().setStretchLastSection(True)
+
+        self._compression_combo_box = QComboBox(self)
+        self._compression_combo_box.addItems(get_compressions())
+        compression_layout = QHBoxLayout()
+        compression_layout.addWidget(QLabel('Compression:', self))
+        compression_layout.addWidget(self._compression_combo_box)
+        compression_layout.addStretch()
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=self)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._topic_table)
+        layout.addLayout(compression_layout)
+        layout.addWidget(button_box)
+
+    def get_topics(self):
+        """
+        :returns: the checked topics, ''list(str)''
+        """
+        return [topic for row, topic in enumerate(self._topics) if self._topic_table.item(row, 0).checkState() == Qt.Checked]
+
+    def get_max_rates(self):
+        """
+        :returns: maximum rate in Hz of the checked topics which are limited, ''dict(str, float)''
+        """
+        max_rates = {}
+        for row, topic in enumerate(self._topics):
+            if self._topic_table.item(row, 0).checkState() == Qt.Checked and self._rate_spin_boxes[row].value() > 0.0:
+                max_rates[topic] = self._rate_spin_boxes[row].value()
+        return max_rates
+
+    def get_compression(self):
+        """
+        :returns: the chosen compression, ''str''
+        """
+        return str(self._compression_combo_box.currentText())
@@ -0,0 +1,247 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Persistent index of the message timestamps in a bag file.
+
+The index is written once to a versioned sidecar file under the ROS home directory. The file is
+named after the path of the bag and records the size and modification time of the bag, so an index
+is only reused while the bag is unchanged. Timestamp arrays are memory-mapped when loaded.
+
+File layout (little-endian):
+  header:        magic, version, bag size, bag mtime, topic count
+  topic headers: name length, topic name, stamp count, stamp data offset
+  stamp data:    float64 arrays aligned to 8 bytes
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import numpy
+import rospkg
+
+import bag_helper
+
+_MAGIC = 'RQTBAGIX'
+_VERSION = 1
+
+_HEADER = struct.Struct('<8sIQdI')
+_TOPIC_HEADER = struct.Struct('<I')
+_TOPIC_DATA = struct.Struct('<QQ')
+
+
+def get_index_dir():
+    """
+    @return: directory holding the index files
+    @rtype:  str
+    """
+    return os.path.join(rospkg.get_ros_home(), 'rqt_bag', 'index_cache')
+
+
+def get_index_path(bag):
+    """
+    Get the path of the index file for the bag.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @return: path of the index file
+    @rtype:  str
+    """
+    bag_path = bag_helper.get_bag_path(bag)
+    return os.path.join(get_index_dir(), hashlib.sha1(bag_path).hexdigest() + '.idx')
+
+
+def build_topic_index(bag, topic):
+    """
+    Build the timestamp index of one topic in the bag.
+
+    Only the in-memory connection indexes of the bag are read, so this is safe to call concurrently
+    for bags which aren't being written.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param topic: topic name
+    @type  topic: str
+    @return: sorted message timestamps in seconds
+    @rtype:  numpy.ndarray
+    """
+    return bag_helper.get_topic_stamps(bag, topic)
+
+
+def load_index(bag):
+    """
+    Load the timestamp index of the bag from its index file.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @return: mapping from topic to sorted message timestamps in seconds, or None if there is no valid index file
+    @rtype:  dict of str to numpy.ndarray
+    """
+    if bag.mode != 'r':
+        return None
+
+    try:
+        bag_size, bag_mtime = bag_helper.get_bag_stat(bag)
+        with open(get_index_path(bag), 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError, mmap.error):
+        return None
+
+    try:
+        magic, version, size, mtime, topic_count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION or size != bag_size or mtime != bag_mtime:
+            return None
+
+        index = {}
+        offset = _HEADER.size
+        for _ in range(topic_count):
+            (name_length,) = _TOPIC_HEADER.unpack_from(data, offset)
+            offset += _TOPIC_HEADER.size
+            topic = data[offset:offset + name_length]
+            offset += name_length
+            count, data_offset = _TOPIC_DATA.unpack_from(data, offset)
+            offset += _TOPIC_DATA.size
+
+            if count == 0:
+                index[topic] = numpy.empty(0, dtype=numpy.float64)
+            else:
+                index[topic] = numpy.frombuffer(data, dtype=numpy.float64, count=count, offset=data_offset)
+
+        return index
+
+    except (struct.error, ValueError):
+        return None
+
+
+def save_index(bag, index):
+    """
+    Write the timestamp index of the bag to its index file.
+
+    @param bag: bag file
+    @type  bag: rosbag.Bag
+    @param index: mapping from topic to sorted message timestamps in seconds
+    @type  index: dict of str to numpy.ndarray
+    @raise IOError, OSError: if the index file can't be written
+    """
+    bag_size, bag_mtime = bag_helper.get_bag_stat(bag)
+
+    topics = sorted(index.keys())
+
+    # Lay out the stamp data after the header, aligned to 8 bytes
+    data_offset = _HEADER.size + sum(_TOPIC_HEADER.size + len(topic) + _TOPIC_DATA.size for topic in topics)
+    data_offset += -data_offset % 8
+
+    header = [_HEADER.pack(_MAGIC, _VERSION, bag_size, bag_mtime, len(topics))]
+    for topic in topics:
+        count = len(index[topic])
+        header.append(_TOPIC_HEADER.pack(len(topic)))
+        header.append(topic)
+        header.append(_TOPIC_DATA.pack(count, data_offset))
+        data_offset += 8 * count
+    header = ''.join(header)
+
+    index_dir = get_index_dir()
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+
+    # Write to a temporary file first so a concurrent reader never sees a partial index
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write('\0' * (-len(header) % 8))
+            for topic in topics:
+                f.write(numpy.ascontiguousarray(index[topic], dtype='<f8').tostring())
+        os.rename(tmp_path, get_index_path(bag))
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+class BagStampIndex(object):
+    """
+    Timestamp index of the topics of one bag, loaded from the index file of the bag or built topic by topic.
+
+    The index is saved to the index file once every topic of the bag has been built. Topics can be built concurrently.
+    """
+    def __init__(self, bag):
+        """
+        @param bag: bag file opened for reading
+        @type  bag: rosbag.Bag
+        """
+        self.bag = bag
+        self._topics = frozenset(bag_helper.get_topics(bag))
+        self._lock = threading.Lock()
+
+        index = load_index(bag)
+        self._saved = index is not None
+        self._index = index if index is not None else {}
+
+    def get_stamps(self, topic):
+        """
+        Get the timestamps of a topic, building its index if it isn't loaded.
+
+        @param topic: topic name
+        @type  topic: str
+        @return: sorted message timestamps in seconds, empty if the bag has no messages on the topic
+        @rtype:  numpy.ndarray
+        """
+        if topic not in self._topics:
+            return numpy.empty(0, dtype=numpy.float64)
+
+        stamps = self._index.get(topic)
+        if stamps is None:
+            stamps = build_topic_index(self.bag, topic)
+            with self._lock:
+                self._index[topic] = stamps
+        return stamps
+
+    def save_if_complete(self):
+        """
+        Write the index to the index file if every topic of the bag is indexed and it hasn't been written yet.
+
+        @return: True if the index was written
+        @rtype:  bool
+        @raise IOError, OSError: if the index file can't be written
+        """
+        with self._lock:
+            if self._saved or not self._topics.issubset(self._index):
+                return False
+            self._saved = True
+            index = dict(self._index)
+
+        save_index(self.bag, index)
+        return True
@@ -30,47 +30,84 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import itertools
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import threading
 import time
 
+from python_qt_binding.QtCore import qWarning
+
 
 class IndexCacheThread(threading.Thread):
     """
     Updates invalid caches.
-    One thread per timeline.
+    One thread per timeline. The topics are indexed concurrently by a pool of worker threads and each
+    topic's cache is published as soon as it is complete.
     """
-    def __init__(self, timeline):
+    def __init__(self, timeline, num_workers=None):
+        """
+        :param timeline: the timeline whose caches to update, ''TimelineFrame''
+        :param num_workers: number of topics indexed concurrently, defaults to the number of cores, ''int''
+        """
         threading.Thread.__init__(self)
         self.timeline = timeline
         self._stop_flag = False
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        self._pool = ThreadPool(num_workers) if num_workers > 1 else None
         self.setDaemon(True)
         self.start()
 
     def run(self):
         while not self._stop_flag:
             with self.timeline.index_cache_cv:
-                # Wait until the cache is dirty
-                while len(self.timeline.invalidated_caches) == 0:
+                # Wait until the cache is dirty or a position index is requested
+                while len(self.timeline.invalidated_caches) == 0 and len(self.timeline.invalidated_position_indexes) == 0:
                     self.timeline.index_cache_cv.wait()
                     if self._stop_flag:
                         return
-                # Update the index for one topic
-                total_topics = len(self.timeline.topics)
-                update_step = max(1, total_topics / 100)
-                topic_num = 1
-                progress = 0
-                updated = False
-                for topic in self.timeline.topics:
-                    if topic in self.timeline.invalidated_caches:
-                        updated = (self.timeline._update_index_cache(topic) > 0)
-                    if topic_num % update_step == 0 or topic_num == total_topics:
-                        new_progress = int(100.0 * (float(topic_num) / total_topics))
-                        if new_progress != progress:
-                            progress = new_progress
-                            if not self._stop_flag:
-                                self.timeline.scene().background_progress = progress
-                                self.timeline.scene().status_bar_changed_signal.emit()
-                    topic_num += 1
+                # Take the invalidated topics along with the caches their updates are based on
+                bag_count = len(self.timeline.scene()._bags)
+                jobs = [(topic, self.timeline.index_cache.get(topic)) for topic in self.timeline.topics if topic in self.timeline.invalidated_caches]
+                self.timeline.invalidated_caches.difference_update([topic for topic, _ in jobs])
+                position_index_topics = list(self.timeline.invalidated_position_indexes)
+                self.timeline.invalidated_position_indexes.clear()
+
+            # Build the requested position indexes first, since a listener is waiting for them
+            for topic in position_index_topics:
+                if self._stop_flag:
+                    return
+                try:
+                    self.timeline.scene().build_position_index(topic)
+                except Exception as ex:
+                    qWarning('Error building position index of topic %s: %s' % (topic, str(ex)))
+
+            # Load the caches without holding the lock, so the timeline can still be drawn
+            if self._pool:
+                updates = self._pool.imap_unordered(self._load_index_cache, jobs)
+            else:
+                updates = itertools.imap(self._load_index_cache, jobs)
+
+            total_topics = len(jobs)
+            if total_topics == 0:
+                continue
+            update_step = max(1, total_topics / 100)
+            progress = 0
+            updated = False
+            for topic_num, (topic, topic_cache, update) in enumerate(updates, 1):
+                if self._stop_flag:
+                    return
+                with self.timeline.index_cache_cv:
+                    if self.timeline._publish_index_cache(topic, topic_cache, bag_count, update) > 0:
+                        updated = True
+                if topic_num % update_step == 0 or topic_num == total_topics:
+                    new_progress = int(100.0 * (float(topic_num) / total_topics))
+                    if new_progress != progress:
+                        progress = new_progress
+                        if not self._stop_flag:
+                            self.timeline.scene().background_progress = progress
+                            self.timeline.scene().status_bar_changed_signal.emit()
 
             if updated:
                 self.timeline.scene().background_progress = 0
@@ -79,8 +116,19 @@ class IndexCacheThread(threading.Thread):
                 # Give the GUI some time to update
                 time.sleep(1.0)
 
+    def _load_index_cache(self, job):
+        topic, topic_cache = job
+        try:
+            update = self.timeline._load_index_cache(topic, topic_cache)
+        except Exception as ex:
+            qWarning('Error indexing topic %s: %s' % (topic, str(ex)))
+            update = None
+        return topic, topic_cache, update
+
     def stop(self):
         self._stop_flag = True
         cv = self.timeline.index_cache_cv
         with cv:
             cv.notify()
+        if self._pool:
+            self._pool.close()
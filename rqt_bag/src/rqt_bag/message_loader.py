@@ -0,0 +1,274 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import itertools
+import multiprocessing
+import threading
+
+import rospy
+
+from python_qt_binding.QtCore import QCoreApplication, QEvent
+from python_qt_binding.QtCore import qWarning
+
+import bag_helper
+from .bag_cache import get_message_cache
+
+
+class ListenerEvent(QEvent):
+    def __init__(self, data):
+        super(ListenerEvent, self).__init__(1024)  # userdefined event constant
+        self.data = data
+
+
+class MessageLoader(object):
+    """
+    Loads the message at the playhead position of each listened topic, then posts it to the topic's listeners as a ListenerEvent.
+
+    One per timeline. A bounded pool of worker threads serves all topics. Playhead positions are coalesced per topic:
+    only the latest position of a topic is loaded and each topic is loaded by at most one worker at a time.
+    Loaded messages are kept in the process-wide message cache.
+
+    While playing, a readahead thread also loads the next messages of each listened topic in the direction of playback,
+    so views and players hit the cache instead of the disk at high play speeds.
+    """
+    def __init__(self, timeline, num_workers=None):
+        """
+        :param timeline: the timeline to load messages from, ''BagTimeline''
+        :param num_workers: number of worker threads, defaults to the number of cores (at most 4), ''int''
+        """
+        self.timeline = timeline
+
+        self._cv = threading.Condition()
+        self._playhead_positions = {}  # topic -> (bag, position)
+        self._pending_topics = collections.deque()  # topics with a playhead position to load, oldest first
+        self._loading_topics = set()
+        self._delivered = {}  # (topic, listener) -> (bag, position) last posted to the listener
+
+        self._message_cache = get_message_cache()
+
+        self._readahead_duration = 1.0  # seconds of playback to read ahead
+        self._readahead_max_entries = 100  # maximum number of messages to read ahead per topic
+        self._readahead_cv = threading.Condition()
+        self._readahead_topics = collections.deque()  # topics to read ahead on, oldest first
+
+        self._stop_flag = False
+
+        if num_workers is None:
+            num_workers = min(4, multiprocessing.cpu_count())
+        self._workers = []
+        for _ in range(max(1, num_workers)):
+            worker = threading.Thread(target=self._run)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+        self._readahead_thread = threading.Thread(target=self._run_readahead)
+        self._readahead_thread.setDaemon(True)
+        self._readahead_thread.start()
+
+    def set_playhead_position(self, topic, bag_playhead_position):
+        """
+        Sets the position of the message at the playhead on a topic.
+        :param topic: the topic, ''str''
+        :param bag_playhead_position: bag and position of the message, or (None, None) if there is none, ''(rosbag.bag, position)''
+        """
+        with self._cv:
+            if self._playhead_positions.get(topic) == bag_playhead_position:
+                return
+            self._playhead_positions[topic] = bag_playhead_position
+
+            # Don't bother loading the message if there are no listeners
+            if self.timeline.has_listeners(topic):
+                self._enqueue(topic)
+
+    def reset(self, topic):
+        """
+        Posts the message at the playhead to the listeners of the topic which haven't received it yet, e.g. a new listener.
+        """
+        with self._cv:
+            if topic in self._playhead_positions:
+                self._enqueue(topic)
+
+    def remove_listener(self, topic, listener):
+        with self._cv:
+            self._delivered.pop((topic, listener), None)
+
+    def stop(self):
+        with self._cv:
+            self._stop_flag = True
+            self._cv.notify_all()
+        with self._readahead_cv:
+            self._readahead_cv.notify_all()
+
+    def _enqueue(self, topic):
+        if topic not in self._pending_topics:
+            self._pending_topics.append(topic)
+            self._cv.notify()
+
+    def _next_topic(self):
+        """
+        :returns: the oldest pending topic which isn't being loaded by another worker, or None
+        """
+        for topic in self._pending_topics:
+            if topic not in self._loading_topics:
+                self._pending_topics.remove(topic)
+                return topic
+        return None
+
+    def _run(self):
+        while True:
+            # Wait for a new playhead position
+            with self._cv:
+                topic = self._next_topic()
+                while topic is None and not self._stop_flag:
+                    self._cv.wait()
+                    topic = self._next_topic()
+                if self._stop_flag:
+                    return
+                self._loading_topics.add(topic)
+                bag_playhead_position = self._playhead_positions[topic]
+                listeners = [listener for listener in self.timeline._listeners.get(topic, []) if self._delivered.get((topic, listener)) != bag_playhead_position]
+
+            try:
+                if listeners:
+                    self._load(topic, bag_playhead_position, listeners)
+            finally:
+                with self._cv:
+                    self._loading_topics.discard(topic)
+                    # Another worker may now take the topic if it got a new position while loading
+                    if topic in self._pending_topics:
+                        self._cv.notify()
+
+    def _load(self, topic, bag_playhead_position, listeners):
+        bag, playhead_position = bag_playhead_position
+
+        # Load the message
+        if playhead_position is None:
+            msg_data = None
+        else:
+            try:
+                msg_data = self._get_message(bag, playhead_position)
+            except Exception as ex:
+                qWarning('Error loading message on topic %s at position %s: %s' % (topic, str(playhead_position), str(ex)))
+                return
+
+            if self.timeline.play_speed != 0.0:
+                self._request_readahead(topic)
+
+        # Inform the views
+        for listener in listeners:
+            try:
+                event = ListenerEvent((bag, msg_data))
+                QCoreApplication.postEvent(listener, event)
+            except Exception as ex:
+                qWarning('Error notifying listener %s: %s' % (type(listener), str(ex)))
+                continue
+            with self._cv:
+                if listener in self.timeline._listeners.get(topic, []):
+                    self._delivered[(topic, listener)] = bag_playhead_position
+
+    def _get_message(self, bag, position):
+        msg_data = self._message_cache.get(bag, position)
+        if msg_data is None:
+            msg_data = self._cache_message(bag, position, self.timeline.read_message(bag, position, raw=True))
+        return msg_data
+
+    def _cache_message(self, bag, position, raw_msg_data):
+        """
+        Deserializes a message read with raw=True and adds it to the message cache.
+        :returns: the message data, ''(str, msg, rospy.Time)''
+        """
+        topic, (_, data, _, _, pytype), t = raw_msg_data
+        msg = pytype()
+        msg.deserialize(data)
+        msg_data = (topic, msg, t)
+        self._message_cache.put(bag, position, msg_data, len(data))
+        return msg_data
+
+    ### Readahead
+
+    def _request_readahead(self, topic):
+        with self._readahead_cv:
+            if topic not in self._readahead_topics:
+                self._readahead_topics.append(topic)
+                self._readahead_cv.notify()
+
+    def _run_readahead(self):
+        while True:
+            with self._readahead_cv:
+                while not self._readahead_topics and not self._stop_flag:
+                    self._readahead_cv.wait()
+                if self._stop_flag:
+                    return
+                topic = self._readahead_topics.popleft()
+
+            try:
+                self._read_ahead(topic)
+            except Exception as ex:
+                qWarning('Error reading ahead on topic %s: %s' % (topic, str(ex)))
+
+    def _read_ahead(self, topic):
+        """
+        Loads the next messages on the topic in the direction of playback into the message cache.
+
+        The window covers _readahead_duration seconds of playback at the current play speed, capped at
+        _readahead_max_entries messages. The messages are read in position order, one batch per chunk.
+        """
+        play_speed = self.timeline.play_speed
+        playhead = self.timeline._timeline_frame.playhead
+        if play_speed == 0.0 or playhead is None or not self.timeline.has_listeners(topic):
+            return
+
+        window = abs(play_speed) * self._readahead_duration
+        if play_speed > 0.0:
+            end_stamp = playhead + rospy.Duration.from_sec(window)
+            entries = list(itertools.islice(self.timeline.get_entries_with_bags(topic, playhead, end_stamp), self._readahead_max_entries))
+        else:
+            start_stamp = rospy.Time.from_sec(max(0.0, playhead.to_sec() - window))
+            entries = list(self.timeline.get_entries_with_bags(topic, start_stamp, playhead))[-self._readahead_max_entries:]
+
+        # Skip the messages which are already cached
+        entries = [(bag, entry.position) for bag, entry in entries if not self._message_cache.contains(bag, entry.position)]
+        if not entries:
+            return
+
+        # Read in position order so each chunk is only read and decompressed once
+        entries.sort(key=lambda bag_position: (bag_position[0].filename, bag_position[1]))
+        for (bag, _), batch in itertools.groupby(entries, key=lambda bag_position: (bag_position[0], bag_helper.get_chunk_position(bag_position[1]))):
+            if self._stop_flag or self.timeline.play_speed == 0.0:
+                return
+
+            positions = [position for _, position in batch]
+            for position, raw_msg_data in zip(positions, self.timeline.read_messages(bag, positions, raw=True)):
+                self._cache_message(bag, position, raw_msg_data)
+
@@ -31,84 +31,289 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 """
-Player listens to messages from the timeline and publishes them to ROS.
+Player publishes the messages of the timeline to ROS as the playhead passes over them.
 """
 
-import rospy
+import collections
+import threading
+import time
 
+import rospy
 
-from python_qt_binding.QtCore import QObject
+import bag_helper
 
 
-class Player(QObject):
+class Player(object):
     """
     This object handles publishing messages as the playhead passes over their position
+
+    A publishing thread walks the merged entries of the published topics in time order, starting at the playhead, and
+    publishes every message at its stamp scaled by the play speed. Publish times are scheduled against a fixed wall
+    clock anchor, so sleep overshoot and read time don't accumulate as drift; messages which are late are published
+    immediately. The schedule is anchored again when the play speed or published topics change, or when the playhead
+    jumps away from the schedule, e.g. when the user moves it or playback wraps around. The playhead may be further off
+    schedule at higher play speeds before playback is anchored again. Messages the playhead passed over when playback
+    is anchored again are not published; they are counted as skipped for each topic.
+
+    In raw mode, messages are published as the serialized data read from the bag, without deserializing and
+    serializing them again, through publishers of raw message classes with the type and md5sum of the recorded message.
     """
-    def __init__(self, timeline):
-        super(Player, self).__init__()
+    _max_playhead_deviation = 0.25  # seconds the playhead may be off schedule at 1x before playback is anchored again
+    _poll_interval = 0.05  # longest sleep before checking for changes
+    _rate_window = 100  # number of recent messages used to measure the rate of a topic
+
+    def __init__(self, timeline, raw=True):
+        """
+        :param timeline: the timeline to publish messages from, ''BagTimeline''
+        :param raw: if True, publish the serialized messages read from the bag, ''bool''
+        """
         self.timeline = timeline
+        self.raw = raw
 
         self._publishing = set()
         self._publishers = {}
+        self._publish_rates = {}  # topic -> _PublishRate
+        self._skipped_counts = {}  # topic -> number of messages skipped since publishing started
+
+        self._cv = threading.Condition()
+        self._topics_changed = False
+        self._stop_flag = False
+
+        self._publish_thread = threading.Thread(target=self._run)
+        self._publish_thread.setDaemon(True)
+        self._publish_thread.start()
 
     def is_publishing(self, topic):
         return topic in self._publishing
 
     def start_publishing(self, topic):
-        if topic in self._publishing:
-            return
-        self._publishing.add(topic)
-        self.timeline.add_listener(topic, self)
+        with self._cv:
+            if topic in self._publishing:
+                return
+            self._publishing.add(topic)
+            self._topics_changed = True
+            self._cv.notify()
 
     def stop_publishing(self, topic):
+        with self._cv:
+            self._stop_publishing(topic)
+
+    def stop(self):
+        with self._cv:
+            for topic in list(self._publishing):
+                self._stop_publishing(topic)
+            self._stop_flag = True
+            self._cv.notify()
+
+    def get_publish_rates(self):
+        """
+        :returns: requested and achieved publish rate in Hz of each topic which is being published, ''dict(str, (float, float))''
+        """
+        with self._cv:
+            return dict((topic, (rate.requested, rate.achieved)) for topic, rate in self._publish_rates.items() if len(rate) > 1)
+
+    def get_skipped_counts(self):
+        """
+        :returns: number of messages skipped on each topic which is being published, ''dict(str, int)''
+        """
+        with self._cv:
+            return dict(self._skipped_counts)
+
+    def _stop_publishing(self, topic):
         if topic not in self._publishing:
             return
-        self.timeline.remove_listener(topic, self)
 
         if topic in self._publishers:
             self._publishers[topic].unregister()
             del self._publishers[topic]
 
         self._publishing.remove(topic)
+        self._publish_rates.pop(topic, None)
+        self._skipped_counts.pop(topic, None)
+        self._topics_changed = True
 
-    def stop(self):
-        for topic in list(self._publishing):
-            self.stop_publishing(topic)
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._stop_flag and not self._can_play():
+                    # The play speed and playhead aren't notified, so poll them
+                    self._cv.wait(self._poll_interval)
+                if self._stop_flag:
+                    return
+                topics = list(self._publishing)
+                self._topics_changed = False
+                self._publish_rates = {}
+
+            try:
+                self._play(topics)
+            except Exception as ex:
+                rospy.logerr('Error publishing messages: %s' % str(ex))
+                time.sleep(self._poll_interval)
+
+    def _can_play(self):
+        # Don't publish unless the playhead is moving forwards
+        return len(self._publishing) > 0 and self.timeline.play_speed > 0.0 and self.timeline._timeline_frame.playhead is not None
+
+    def _play(self, topics):
+        """
+        Publishes the messages on the topics from the playhead to the end of the play region, until the schedule changes.
+        :param topics: the topics to publish, ''list(str)''
+        """
+        play_speed = self.timeline.play_speed
+        start_stamp = self.timeline._timeline_frame.playhead
+        _, end_stamp = self.timeline._timeline_frame.play_region
+        start_time = time.time()
+
+        entries = self.timeline.get_entries_with_bags(topics, start_stamp, end_stamp)
+        for bag, entry in entries:
+            publish_time = start_time + (entry.time - start_stamp).to_sec() / play_speed
+            while True:
+                if self._is_off_schedule(play_speed, start_stamp, start_time):
+                    self._count_skipped(topics, entry)
+                    return
+                delay = publish_time - time.time()
+                if delay <= 0.0:
+                    break
+                time.sleep(min(delay, self._poll_interval))
+
+            self._publish(bag, entry)
 
-    def message_viewed(self, bag, msg_data):
+        # All messages up to the end of the play region are published; wait for the playhead to move back
+        last_playhead = self.timeline._timeline_frame.playhead
+        while not self._is_changed(play_speed):
+            playhead = self.timeline._timeline_frame.playhead
+            if playhead is None or playhead < last_playhead:
+                return
+            last_playhead = playhead
+            time.sleep(self._poll_interval)
+
+    def _is_changed(self, play_speed):
+        return self._stop_flag or self._topics_changed or self.timeline.play_speed != play_speed
+
+    def _is_off_schedule(self, play_speed, start_stamp, start_time):
+        """
+        :returns: True if playback changed or the playhead is too far from where the schedule is, ''bool''
+        """
+        if self._is_changed(play_speed):
+            return True
+
+        playhead = self.timeline._timeline_frame.playhead
+        if playhead is None:
+            return True
+
+        playhead_time = start_time + (playhead - start_stamp).to_sec() / play_speed
+        return abs(playhead_time - time.time()) > self._max_playhead_deviation * max(1.0, play_speed)
+
+    def _count_skipped(self, topics, entry):
         """
-        When a message is viewed publish it
-        :param bag: the bag the message is in, ''rosbag.bag''
-        :param msg_data: tuple of the message data and topic info, ''(str, msg)''
+        Counts the messages from the next message to publish up to the playhead, which playback skips when it's
+        anchored again at the playhead.
+        :param topics: the topics being published, ''list(str)''
+        :param entry: index entry of the next message to publish, ''rosbag.bag._IndexEntry''
         """
-        # Don't publish unless the playhead is moving.
-        if self.timeline.play_speed <= 0.0:
+        playhead = self.timeline._timeline_frame.playhead
+        if playhead is None or playhead <= entry.time:
             return
 
-        topic, msg, _ = msg_data
+        skipped = {}
+        start, end = entry.time.to_sec(), playhead.to_sec()
+        for topic in topics:
+            position_index = self.timeline.get_position_index(topic)
+            if position_index is not None:
+                skipped[topic] = position_index.count(start, end)
+            else:
+                # The position index isn't built yet or a bag is being recorded, so count the entries
+                topic_entries = self.timeline.get_entries_with_bags(topic, entry.time, playhead)
+                skipped[topic] = sum(1 for _, topic_entry in topic_entries if topic_entry.time < playhead)
 
-        # Create publisher if this is the first message on the topic
-        if topic not in self._publishers:
-            try:
-                self._publishers[topic] = rospy.Publisher(topic, type(msg))
-            except Exception as ex:
-                # Any errors, stop listening/publishing to this topic
-                rospy.logerr('Error creating publisher on topic %s for type %s. \nError text: %s' % (topic, str(type(msg)), str(ex)))
-                self.stop_publishing(topic)
+        with self._cv:
+            for topic, count in skipped.items():
+                if count > 0 and topic in self._publishing:
+                    self._skipped_counts[topic] = self._skipped_counts.get(topic, 0) + count
+
+    def _publish(self, bag, entry):
+        try:
+            topic, msg, _ = self.timeline.read_message(bag, entry.position, raw=self.raw)
+        except Exception as ex:
+            rospy.logerr('Error reading message at position %s: %s' % (str(entry.position), str(ex)))
+            return
+
+        with self._cv:
+            if topic not in self._publishing:
+                return
 
-        self._publishers[topic].publish(msg)
+            # Create publisher if this is the first message on the topic
+            publisher = self._publishers.get(topic)
+            if publisher is None:
+                if self.raw:
+                    datatype, _, md5sum, _, pytype = msg
+                    msg_class = bag_helper.get_raw_message_class(datatype, md5sum, pytype._full_text)
+                else:
+                    msg_class = type(msg)
+                try:
+                    publisher = rospy.Publisher(topic, msg_class)
+                except Exception as ex:
+                    # Any errors, stop publishing to this topic
+                    rospy.logerr('Error creating publisher on topic %s for type %s. \nError text: %s' % (topic, str(msg_class._type), str(ex)))
+                    self._stop_publishing(topic)
+                    return
+                self._publishers[topic] = publisher
 
-    def message_cleared(self):
-        pass
+            publish_rate = self._publish_rates.get(topic)
+            if publish_rate is None:
+                publish_rate = self._publish_rates[topic] = _PublishRate(self.timeline.play_speed, self._rate_window)
+
+        if self.raw:
+            raw_msg = publisher.data_class()
+            raw_msg._buff = msg[1]
+            msg = raw_msg
+
+        try:
+            publisher.publish(msg)
+        except rospy.ROSException:
+            # The topic stopped being published meanwhile
+            return
 
-    def event(self, event):
+        with self._cv:
+            publish_rate.add(time.time(), entry.time.to_sec())
+
+
+class _PublishRate(object):
+    """
+    Measures the rate of the recent messages published on a topic against the rate requested by their stamps.
+    """
+    def __init__(self, play_speed, window):
+        """
+        :param play_speed: play speed the messages are published at, ''float''
+        :param window: number of recent messages to measure, ''int''
+        """
+        self._play_speed = play_speed
+        self._publish_times = collections.deque(maxlen=window)
+        self._stamps = collections.deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._stamps)
+
+    def add(self, publish_time, stamp):
+        self._publish_times.append(publish_time)
+        self._stamps.append(stamp)
+
+    @property
+    def requested(self):
         """
-        This function will be called to process events posted by post_event
-        it will call message_cleared or message_viewed with the relevant data
+        :returns: rate in Hz given by the stamps of the messages at the play speed, ''float''
+        """
+        return _get_rate(len(self._stamps), self._stamps[-1] - self._stamps[0]) * self._play_speed
+
+    @property
+    def achieved(self):
         """
-        bag, msg_data = event.data
-        if msg_data:
-            self.message_viewed(bag, msg_data)
-        else:
-            self.message_cleared()
-        return True
+        :returns: rate in Hz the messages were published at, ''float''
+        """
+        return _get_rate(len(self._publish_times), self._publish_times[-1] - self._publish_times[0])
+
+
+def _get_rate(count, duration):
+    if duration <= 0.0:
+        return 0.0
+    return (count - 1) / duration
@@ -0,0 +1,85 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy
+
+
+class PositionIndex(object):
+    """
+    Positions of the messages on a topic in all bags, sorted by stamp.
+
+    The stamps are stored in a float64 array and the bag number, chunk position and offset of each message in int64
+    arrays in the same order, so the message at a stamp is found with one binary search. Messages of bags without
+    chunks have an offset of -1 and their position in the chunk position array.
+    """
+    def __init__(self, stamps, bag_numbers, chunk_positions, offsets, bags):
+        """
+        :param stamps: stamps of the messages in seconds, in any order, ''numpy.array''
+        :param bag_numbers: index in bags of the bag of each message, ''numpy.array''
+        :param chunk_positions: position of the chunk of each message, ''numpy.array''
+        :param offsets: offset of each message in its chunk, ''numpy.array''
+        :param bags: the bags, ''list(rosbag.bag)''
+        """
+        stamps = numpy.asarray(stamps, dtype=numpy.float64)
+        order = numpy.argsort(stamps, kind='mergesort')
+        self._stamps = stamps[order]
+        self._bag_numbers = numpy.asarray(bag_numbers, dtype=numpy.int64)[order]
+        self._chunk_positions = numpy.asarray(chunk_positions, dtype=numpy.int64)[order]
+        self._offsets = numpy.asarray(offsets, dtype=numpy.int64)[order]
+        self._bags = list(bags)
+
+    def __len__(self):
+        return len(self._stamps)
+
+    def lookup(self, stamp):
+        """
+        :param stamp: stamp to look up in seconds, ''float''
+        :returns: bag and position of the last message at or before the stamp, or (None, None), ''(rosbag.bag, position)''
+        """
+        index = int(numpy.searchsorted(self._stamps, stamp, 'right'))
+        if index == 0:
+            return None, None
+        index -= 1
+        bag = self._bags[self._bag_numbers[index]]
+        chunk_pos, offset = int(self._chunk_positions[index]), int(self._offsets[index])
+        if offset < 0:
+            return bag, chunk_pos
+        return bag, (chunk_pos, offset)
+
+    def count(self, start_stamp, end_stamp):
+        """
+        :param start_stamp: first stamp to count in seconds, ''float''
+        :param end_stamp: stamp to count up to in seconds, exclusive, ''float''
+        :returns: number of messages from start_stamp up to end_stamp, ''int''
+        """
+        start_index, end_index = numpy.searchsorted(self._stamps, (start_stamp, end_stamp), 'left')
+        return max(0, int(end_index - start_index))
@@ -34,6 +34,7 @@
 Recorder subscribes to ROS messages and writes them to a bag file.
 """
 
+import inspect
 import Queue
 import re
 import threading
@@ -44,14 +45,25 @@ import rosgraph
 import roslib
 import rospy
 
+import bag_helper
+
 import sys
 
 
 class Recorder(object):
-    def __init__(self, filename, bag_lock=None, all=True, topics=[], regex=False, limit=0, master_check_interval=1.0):
+    def __init__(self, filename, bag_lock=None, all=True, topics=[], regex=False, limit=0, master_check_interval=1.0,
+                 max_queue_size=1000, max_queue_wait=0.1, max_batch_size=1000, max_notify_rate=10.0, raw=True):
         """
         Subscribe to ROS messages and record them to a bag file.
 
+        Received messages are queued and written by a writer thread, in batches holding the bag lock once.
+        The queue is bounded: when it's full, subscriber callbacks wait for the writer up to max_queue_wait seconds and
+        then drop the message. Listeners are notified of the last message recorded on each topic at most
+        max_notify_rate times per second.
+
+        In raw mode, topics are subscribed to as rospy.AnyMsg and the serialized messages are written to the bag as
+        received, with the connection headers of the publishers, without deserializing and serializing them again.
+
         @param filename: filename of bag to write to
         @type  filename: str
         @param all: all topics are to be recorded [default: True]
@@ -64,12 +76,26 @@ class Recorder(object):
         @type  limit: int
         @param master_check_interval: period (in seconds) to check master for new topic publications [default: 1]
         @type  master_check_interval: float
+        @param max_queue_size: maximum number of messages waiting to be written [default: 1000]
+        @type  max_queue_size: int
+        @param max_queue_wait: time (in seconds) to wait for room in a full queue before dropping a message [default: 0.1]
+        @type  max_queue_wait: float
+        @param max_batch_size: maximum number of messages written while holding the bag lock [default: 1000]
+        @type  max_batch_size: int
+        @param max_notify_rate: maximum rate (in Hz) of notifying listeners [default: 10]
+        @type  max_notify_rate: float
+        @param raw: record the serialized messages [default: True]
+        @type  raw: bool
         """
         self._all = all
         self._topics = topics
         self._regex = regex
         self._limit = limit
         self._master_check_interval = master_check_interval
+        self._max_queue_wait = max_queue_wait
+        self._max_batch_size = max_batch_size
+        self._notify_interval = 1.0 / max_notify_rate
+        self._raw = raw
 
         self._bag = rosbag.Bag(filename, 'w')
         self._bag_lock = bag_lock if bag_lock else threading.Lock()
@@ -78,10 +104,11 @@ class Recorder(object):
         self._limited_topics = set()
         self._failed_topics = set()
         self._last_update = time.time()
-        self._write_queue = Queue.Queue()
+        self._write_queue = Queue.Queue(max_queue_size)
         self._paused = False
         self._stop_condition = threading.Condition()
         self._stop_flag = False
+        self._unsubscribed = threading.Event()  # set once no more messages can be queued
 
         # Compile regular expressions
         if self._regex:
@@ -90,6 +117,10 @@ class Recorder(object):
             self._regexes = None
 
         self._message_count = {}  # topic -> int (track number of messages recorded on each topic)
+        self._dropped_count = {}  # topic -> int (track number of messages dropped on each topic because the queue was full)
+        self._count_lock = threading.Lock()  # subscriber callbacks run on a thread per connection
+        self._datatypes = {}  # topic -> datatype advertised on the master
+        self._failed_writes = set()  # topics on which a message failed to be written
 
         self._master_check_thread = threading.Thread(target=self._run_master_check)
         self._write_thread = threading.Thread(target=self._run_write)
@@ -113,6 +144,15 @@ class Recorder(object):
         self._master_check_thread.start()
         self._write_thread.start()
 
+    def get_dropped_counts(self):
+        """
+        Get the number of messages dropped on each topic because they couldn't be written fast enough.
+        @return: mapping from topic to number of dropped messages
+        @rtype:  dict of str to int
+        """
+        with self._count_lock:
+            return dict(self._dropped_count)
+
     @property
     def paused(self):
         return self._paused
@@ -134,8 +174,6 @@ class Recorder(object):
             self._stop_flag = True
             self._stop_condition.notify_all()
 
-        self._write_queue.put(self)
-
     ## Implementation
 
     def _run_master_check(self):
@@ -154,9 +192,14 @@ class Recorder(object):
                         continue
 
                     try:
-                        pytype = roslib.message.get_message_class(datatype)
+                        if self._raw:
+                            pytype = rospy.AnyMsg
+                        else:
+                            pytype = roslib.message.get_message_class(datatype)
 
+                        self._datatypes[topic] = datatype
                         self._message_count[topic] = 0
+                        self._dropped_count[topic] = 0
 
                         self._subscriber_helpers[topic] = _SubscriberHelper(self, topic, pytype)
                     except Exception, ex:
@@ -174,9 +217,15 @@ class Recorder(object):
         for topic in list(self._subscriber_helpers.keys()):
             self._unsubscribe(topic)
 
+        # Let the writer write the messages still queued
+        self._unsubscribed.set()
+        if self._write_thread.is_alive():
+            self._write_thread.join()
+
         # Close the bag file so that the index gets written
         try:
-            self._bag.close()
+            with self._bag_lock:
+                self._bag.close()
         except Exception, ex:
             print >> sys.stderr, 'Error closing bag [%s]: %s' % (self._bag.filename, str(ex))
 
@@ -205,35 +254,130 @@ class Recorder(object):
         if self._paused:
             return
 
-        if self._limit and self._message_count[topic] >= self._limit:
+        with self._count_lock:
+            limit_reached = self._limit and self._message_count[topic] >= self._limit
+        if limit_reached:
             self._limited_topics.add(topic)
             self._unsubscribe(topic)
             return
 
-        self._write_queue.put((topic, m, rospy.get_rostime()))
-        self._message_count[topic] += 1
-
-    def _run_write(self):
         try:
-            while not self._stop_flag:
-                # Wait for a message
-                item = self._write_queue.get()
+            # Apply backpressure to the subscriber while the writer catches up
+            self._write_queue.put((topic, m, rospy.get_rostime()), timeout=self._max_queue_wait)
+        except Queue.Full:
+            with self._count_lock:
+                self._dropped_count[topic] += 1
+                first_drop = self._dropped_count[topic] == 1
+            if first_drop:
+                print >> sys.stderr, 'Recording queue is full, dropping messages on %s' % topic
+            return
+
+        with self._count_lock:
+            self._message_count[topic] += 1
 
-                if item == self:
+    def _run_write(self):
+        recorded = {}  # topic -> (message, time) of the last message recorded since listeners were notified
+        last_notify = time.time()
+        while not self._unsubscribed.is_set():
+            # Wait for a message, or until listeners are due to be notified
+            timeout = max(0.0, last_notify + self._notify_interval - time.time())
+            try:
+                batch = [self._write_queue.get(timeout=timeout if recorded else self._notify_interval)]
+            except Queue.Empty:
+                batch = []
+
+            # Take the rest of the queued messages
+            while batch and len(batch) < self._max_batch_size:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            # Write to the bag
+            if batch:
+                recorded.update(self._write_batch(batch))
+
+            # Notify listeners of the last message recorded on each topic
+            now = time.time()
+            if recorded and now - last_notify >= self._notify_interval:
+                self._notify_listeners(recorded)
+                recorded = {}
+                last_notify = now
+
+        # Write the messages queued before the topics were unsubscribed
+        batch = []
+        while True:
+            try:
+                batch.append(self._write_queue.get_nowait())
+            except Queue.Empty:
+                break
+        if batch:
+            recorded.update(self._write_batch(batch))
+        self._notify_listeners(recorded)
+
+    def _write_batch(self, batch):
+        """
+        Write queued messages to the bag, holding the bag lock. A message which fails to be written is skipped, so
+        recording carries on; the error is printed for the first failing message on each topic.
+        @param batch: topic, message and time of each message
+        @type  batch: list of (str, Message, rospy.Time)
+        @return: the last message written on each topic and its time
+        @rtype:  dict of str to (Message, rospy.Time)
+        """
+        written = {}
+        with self._bag_lock:
+            for topic, m, t in batch:
+                try:
+                    if self._raw:
+                        self._write_raw(topic, m, t)
+                    else:
+                        self._bag.write(topic, m, t)
+                except Exception, ex:
+                    if topic not in self._failed_writes:
+                        self._failed_writes.add(topic)
+                        print >> sys.stderr, 'Error writing message on %s to bag: %s' % (topic, str(ex))
                     continue
+                written[topic] = (m, t)
+        return written
 
-                topic, m, t = item
+    def _notify_listeners(self, recorded):
+        for topic, (m, t) in recorded.items():
+            for listener in self._listeners:
+                try:
+                    listener(topic, m, t)
+                except Exception, ex:
+                    print >> sys.stderr, 'Error notifying recorder listener: %s' % str(ex)
 
-                # Write to the bag
-                with self._bag_lock:
-                    self._bag.write(topic, m, t)
+    def _write_raw(self, topic, m, t):
+        """
+        Write a message received as rospy.AnyMsg, with the connection header of its publisher if rosbag supports it.
 
-                # Notify listeners that a message has been recorded
-                for listener in self._listeners:
-                    listener(topic, m, t)
+        rosbag keeps a single connection per topic, so only the header of the first publisher on a topic is written;
+        messages from other publishers are written under that connection. A message whose connection header lacks its
+        type, md5sum or definition is deserialized and written as the type advertised for its topic instead.
+        """
+        header = getattr(m, '_connection_header', None) or {}
+        datatype, md5sum, message_definition = header.get('type'), header.get('md5sum'), header.get('message_definition')
+        if not (datatype and md5sum and message_definition):
+            # The connection header is incomplete, so write the message as the type advertised for the topic
+            msg = roslib.message.get_message_class(self._datatypes[topic])()
+            msg.deserialize(m._buff)
+            self._bag.write(topic, msg, t)
+            return
 
-        except Exception, ex:
-            print >> sys.stderr, 'Error write to bag: %s' % str(ex)
+        pytype = bag_helper.get_raw_message_class(datatype, md5sum, message_definition)
+        raw_msg = (datatype, m._buff, md5sum, None, pytype)
+
+        if _write_supports_connection_header:
+            connection_header = dict(header)
+            connection_header['topic'] = topic
+            self._bag.write(topic, raw_msg, t, raw=True, connection_header=connection_header)
+        else:
+            self._bag.write(topic, raw_msg, t, raw=True)
+
+
+# Older versions of rosbag write their own connection headers
+_write_supports_connection_header = 'connection_header' in inspect.getargspec(rosbag.Bag.write).args
 
 
 class _SubscriberHelper(object):
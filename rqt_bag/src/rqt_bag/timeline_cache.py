@@ -31,147 +31,309 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 
-import bisect
-import Queue
+import collections
+import random
+import sys
 import threading
-import time
+import weakref
 
 
 class TimelineCache(threading.Thread):
     """
     Caches items for timeline renderers
+
+    Items are evicted least recently used first once their total size exceeds max_cache_bytes, which is shared by all topics.
+    Recency is kept in an ordered dict, so finding the least recently used item is O(1). The cached stamps of each topic
+    are kept in a skip list, so looking up the item closest to a stamp, adding and evicting an item are O(log n).
+    Hits, misses and the total size of the cached items are counted for tuning.
+
+    Enqueued items are loaded by num_workers threads. If a visible range is set, items inside it are loaded first,
+    items within one range width of it next, and items further away are dropped.
     """
-    def __init__(self, loader, listener=None, max_cache_size=100):
+    def __init__(self, loader, listener=None, max_cache_bytes=64 * 1024 * 1024, sizeof=sys.getsizeof, num_workers=1):
+        """
+        :param loader: function loading an item, called with (topic, stamp, item details) and returning (msg stamp, item)
+        :param listener: function called with (topic, msg stamp, item) after an item is loaded
+        :param max_cache_bytes: maximum total size of the cached items over all topics, ''int''
+        :param sizeof: function returning the size of an item in bytes
+        :param num_workers: number of threads loading items, ''int''
+        """
         threading.Thread.__init__(self)
 
         self.loader = loader
         self.listener = listener
+        self.sizeof = sizeof
         self.stop_flag = False
         self.lock = threading.RLock()
-        self.items = {}  # topic -> [(timestamp, items), ...]
-        self.last_accessed = {}  # topic -> [(access time, timestamp), ...]
-        self.item_access = {}  # topic -> timestamp -> access time
-        self.max_cache_size = max_cache_size  # max number of items to cache (per topic)
-        self.queue = Queue.Queue()
+        self.items = {}  # topic -> _StampSkipList of the cached stamps
+        self.last_accessed = collections.OrderedDict()  # (topic, timestamp) -> (item, size), least recently used first
+        self.max_cache_bytes = max_cache_bytes
+        self.nbytes = 0  # total size of the cached items, kept within max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+        self.cv = threading.Condition(self.lock)
+        self.pending = collections.OrderedDict()  # (topic, stamp) -> (topic, stamp, time threshold, item details), oldest first
+        self.loading = set()  # (topic, stamp) of the items being loaded
+        self.visible_range = None  # (start stamp, end stamp)
         self.setDaemon(True)
         self.start()
+        _timeline_caches.add(self)
+
+        self._workers = []
+        for _ in range(num_workers - 1):
+            worker = threading.Thread(target=self.run)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def hit_rate(self):
+        """
+        :returns: fraction of get_item calls which found an item, ''float''
+        """
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
 
     def run(self):
-        while not self.stop_flag:
+        while True:
             # Get next item to load
-            entry = self.queue.get()
-            # self used to signal a change in stop_flag
-            if entry == self:
-                continue
-            # Check we haven't already cached it
-            topic, stamp, time_threshold, item_details = entry
-
-            if not self.get_item(topic, stamp, time_threshold):
-                # Load the item
-                msg_stamp, item = self.loader(topic, stamp, item_details)
-                if item:
-                    # Store in the cache
-                    self.cache_item(topic, msg_stamp, item)
-
-                    if self.listener:
-                        self.listener(topic, msg_stamp, item)
-#                else:
-#                    try:
-#                        qWarning('Failed to load:%s' % entry)
-#                    except:
-#                        qWarning('Failed to load cache item')
-            self.queue.task_done()
+            with self.cv:
+                entry = self._next_entry()
+                while entry is None and not self.stop_flag:
+                    self.cv.wait()
+                    entry = self._next_entry()
+                if self.stop_flag:
+                    return
+                topic, stamp, time_threshold, item_details = entry
+                self.loading.add((topic, stamp))
+
+            try:
+                # Check we haven't already cached it
+                if not self._find_item(topic, stamp, time_threshold):
+                    # Load the item
+                    msg_stamp, item = self.loader(topic, stamp, item_details)
+                    if item:
+                        # Store in the cache
+                        self.cache_item(topic, msg_stamp, item)
+
+                        if self.listener:
+                            self.listener(topic, msg_stamp, item)
+#                    else:
+#                        try:
+#                            qWarning('Failed to load:%s' % entry)
+#                        except:
+#                            qWarning('Failed to load cache item')
+            finally:
+                with self.cv:
+                    self.loading.discard((topic, stamp))
 
     def enqueue(self, entry):
-        self.queue.put(entry)
+        """
+        :param entry: item to load, ''(topic, stamp, time threshold, item details)''
+        """
+        topic, stamp, _, _ = entry
+        with self.cv:
+            key = (topic, stamp)
+            if key not in self.pending and key not in self.loading:
+                self.pending[key] = entry
+                self.cv.notify()
+
+    def set_visible_range(self, start_stamp, end_stamp):
+        """
+        Sets the range of stamps currently displayed, used to prioritize and drop enqueued items.
+        """
+        with self.cv:
+            self.visible_range = (start_stamp, end_stamp)
+
+    def _next_entry(self):
+        """
+        Takes the next entry to load from the pending entries, dropping entries too far from the visible range.
+        :returns: the entry, or None if there is none
+        """
+        if not self.pending:
+            return None
+        if self.visible_range is None:
+            return self.pending.popitem(last=False)[1]
+
+        start_stamp, end_stamp = self.visible_range
+        margin = end_stamp - start_stamp
+        nearby_key = None
+        for key in self.pending.keys():
+            stamp = key[1]
+            if start_stamp <= stamp <= end_stamp:
+                return self.pending.pop(key)
+            if start_stamp - margin <= stamp <= end_stamp + margin:
+                if nearby_key is None:
+                    nearby_key = key
+            else:
+                del self.pending[key]
+
+        if nearby_key is None:
+            return None
+        return self.pending.pop(nearby_key)
 
     def cache_item(self, topic, t, item):
+        stamp = t.to_sec()
+        size = self.sizeof(item)
         with self.lock:
-            if topic not in self.items:
-                self.items[topic] = []
-            topic_cache = self.items[topic]
-
-            cache_entry = (t.to_sec(), item)
-            cache_index = bisect.bisect_right(topic_cache, cache_entry)
-            topic_cache.insert(cache_index, cache_entry)
+            key = (topic, stamp)
+            if key in self.last_accessed:
+                _, old_size = self.last_accessed.pop(key)
+                self.nbytes -= old_size
+            else:
+                topic_cache = self.items.get(topic)
+                if topic_cache is None:
+                    topic_cache = self.items[topic] = _StampSkipList()
+                topic_cache.add(stamp)
 
-            self._update_last_accessed(topic, t.to_sec())
+            self.last_accessed[key] = (item, size)
+            self.nbytes += size
 
             self._limit_cache()
 
     def get_item(self, topic, stamp, time_threshold):
+        """
+        Gets the cached item closest to stamp if it is within time_threshold secs, counting a hit or miss.
+        """
+        with self.lock:
+            item = self._find_item(topic, stamp, time_threshold)
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return item
+
+    def _find_item(self, topic, stamp, time_threshold):
         with self.lock:
             # Attempt to get a item from the cache that's within time_threshold secs from stamp
             topic_cache = self.items.get(topic)
-            if topic_cache:
-                cache_index = max(0, bisect.bisect_right(topic_cache, (stamp, None)) - 1)
-
-                if cache_index <= len(topic_cache) - 1:
-                    # Get cache entry before (or at) timestamp, and entry after
-                    (cache_before_stamp, cache_before_item) = topic_cache[cache_index]
-                    if cache_index < len(topic_cache) - 1:
-                        cache_after_stamp, cache_after_item = topic_cache[cache_index + 1]
-                    else:
-                        cache_after_stamp = None
-
-                    # Find closest entry
-                    cache_before_dist = abs(stamp - cache_before_stamp)
-                    if cache_after_stamp:
-                        cache_after_dist = abs(cache_after_stamp - stamp)
-
-                    if cache_after_stamp and cache_after_dist < cache_before_dist:
-                        cache_dist, cache_stamp, cache_item = cache_after_dist, cache_after_stamp, cache_after_item
-                    else:
-                        cache_dist, cache_stamp, cache_item = cache_before_dist, cache_before_stamp, cache_before_item
-
-                    # Check entry is close enough
-                    if cache_dist <= time_threshold:
-                        self._update_last_accessed(topic, cache_stamp)
-                        return cache_item
-            return None
+            if not topic_cache:
+                return None
 
-    def _update_last_accessed(self, topic, stamp):
+            # Find closest entry
+            cache_stamp = topic_cache.closest(stamp)
+
+            # Check entry is close enough
+            if abs(cache_stamp - stamp) > time_threshold:
+                return None
+
+            key = (topic, cache_stamp)
+            cache_entry = self.last_accessed.pop(key)
+            self.last_accessed[key] = cache_entry
+            return cache_entry[0]
+
+    def _limit_cache(self):
         """
-        Maintains a sorted list of cache accesses by timestamp for each topic.
+        Removes LRU's from cache until the total size of the items is <= max_cache_bytes.
         """
         with self.lock:
-            access_time = time.time()
+            while self.nbytes > self.max_cache_bytes and self.last_accessed:
+                (topic, lru_stamp), (_, size) = self.last_accessed.popitem(last=False)
+                self.nbytes -= size
 
-            if topic not in self.last_accessed:
-                self.last_accessed[topic] = [(access_time, stamp)]
-                self.item_access[topic] = {stamp: access_time}
-                return
+                self.items[topic].remove(lru_stamp)
 
-            topic_last_accessed = self.last_accessed[topic]
-            topic_item_access = self.item_access[topic]
+    def stop(self):
+        with self.cv:
+            self.stop_flag = True
+            self.cv.notify_all()
 
-            if stamp in topic_item_access:
-                last_access = topic_item_access[stamp]
 
-                index = bisect.bisect_left(topic_last_accessed, (last_access, None))
-                assert(topic_last_accessed[index][1] == stamp)
+_timeline_caches = weakref.WeakSet()
 
-                del topic_last_accessed[index]
 
-            topic_last_accessed.append((access_time, stamp))
-            topic_item_access[stamp] = access_time
+def get_timeline_cache_stats():
+    """
+    :returns: hits, misses and total size in bytes of the items of all timeline caches in the process, ''(int, int, int)''
+    """
+    caches = list(_timeline_caches)
+    return sum(cache.hits for cache in caches), sum(cache.misses for cache in caches), sum(cache.nbytes for cache in caches)
 
-    def _limit_cache(self):
-        """
-        Removes LRU's from cache until size of each topic's cache is <= max_cache_size.
-        """
-        with self.lock:
-            for topic, topic_cache in self.items.items():
-                while len(topic_cache) > self.max_cache_size:
-                    lru_stamp = self.last_accessed[topic][0][1]
 
-                    cache_index = bisect.bisect_left(topic_cache, (lru_stamp, None))
-                    assert(topic_cache[cache_index][0] == lru_stamp)
+class _StampSkipList(object):
+    """
+    Sorted set of stamps in a skip list. Adding and removing a stamp and finding the stamp closest to another take
+    O(log n) expected time.
+    """
+    _max_level = 24
 
-                    del topic_cache[cache_index]
-                    del self.last_accessed[topic][0]
-                    del self.item_access[topic][lru_stamp]
+    class _Node(object):
+        __slots__ = ('stamp', 'next')
 
-    def stop(self):
-        self.stop_flag = True
-        self.queue.put(self)
+        def __init__(self, stamp, level):
+            self.stamp = stamp
+            self.next = [None] * level
+
+    def __init__(self):
+        self._head = self._Node(None, self._max_level)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.stamp
+            node = node.next[0]
+
+    def add(self, stamp):
+        update = self._find_before(stamp)
+        next_node = update[0].next[0]
+        if next_node is not None and next_node.stamp == stamp:
+            return
+
+        level = 1
+        while level < self._max_level and random.random() < 0.5:
+            level += 1
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+            self._level = level
+
+        node = self._Node(stamp, level)
+        for i in range(level):
+            node.next[i] = update[i].next[i]
+            update[i].next[i] = node
+        self._size += 1
+
+    def remove(self, stamp):
+        update = self._find_before(stamp)
+        node = update[0].next[0]
+        if node is None or node.stamp != stamp:
+            raise KeyError(stamp)
+
+        for i in range(len(node.next)):
+            update[i].next[i] = node.next[i]
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+    def closest(self, stamp):
+        """
+        :returns: the stored stamp closest to stamp, or None if there is none, ''float''
+        """
+        before = self._find_before(stamp)[0]
+        after = before.next[0]
+        if before is self._head:
+            return None if after is None else after.stamp
+        if after is None or stamp - before.stamp <= after.stamp - stamp:
+            return before.stamp
+        return after.stamp
+
+    def _find_before(self, stamp):
+        """
+        :returns: the last node before stamp on each level, ''list(_Node)''
+        """
+        update = [self._head] * self._max_level
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            next_node = node.next[i]
+            while next_node is not None and next_node.stamp < stamp:
+                node = next_node
+                next_node = node.next[i]
+            update[i] = node
+        return update
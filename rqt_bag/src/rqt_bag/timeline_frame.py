@@ -35,11 +35,12 @@ from python_qt_binding.QtCore import qDebug, QPointF, QRectF, Qt, qWarning
 from python_qt_binding.QtGui import QBrush, QCursor, QColor, QFont, QFontMetrics, QGraphicsItem, QPen, QPolygonF
 import rospy
 
-import bisect
+import numpy
 import threading
 
 from .index_cache_thread import IndexCacheThread
 from .plugins.raw_view import RawView
+from .topic_index import TopicIndex
 
 
 class _SelectionMode(object):
@@ -176,8 +177,9 @@ class TimelineFrame(QGraphicsItem):
 
         # Bag indexer for rendering the default message views on the timeline
         self.index_cache_cv = threading.Condition()
-        self.index_cache = {}
+        self.index_cache = {}  # topic -> TopicIndex
         self.invalidated_caches = set()
+        self.invalidated_position_indexes = set()  # topics whose position index is to be built
         self._index_cache_thread = IndexCacheThread(self)
 
     # TODO the API interface should exist entirely at the bag_timeline level. Add a "get_draw_parameters()" at the bag_timeline level to access these
@@ -214,18 +216,10 @@ class TimelineFrame(QGraphicsItem):
                     dstamp = self._stamp_left - self._start_stamp.to_sec()
                 self.translate_timeline(-dstamp)
 
-            # Update the playhead positions
-            for topic in self.topics:
-                bag, entry = self.scene().get_entry(self._playhead, topic)
-                if entry:
-                    if topic in self.scene()._playhead_positions and self.scene()._playhead_positions[topic] == (bag, entry.position):
-                        continue
-                    new_playhead_position = (bag, entry.position)
-                else:
-                    new_playhead_position = (None, None)
-                with self.scene()._playhead_positions_cvs[topic]:
-                    self.scene()._playhead_positions[topic] = new_playhead_position
-                    self.scene()._playhead_positions_cvs[topic].notify_all()  # notify all message loaders that a new message needs to be loaded
+            # Update the playhead positions of the topics with listeners
+            for topic in self.scene().get_listened_topics():
+                new_playhead_position = self.scene().get_position(self._playhead, topic)
+                self.scene()._message_loader.set_playhead_position(topic, new_playhead_position)  # the message loader loads the new message if needed
             self.scene().update()
             self.scene().status_bar_changed_signal.emit()
 
@@ -361,28 +355,29 @@ class TimelineFrame(QGraphicsItem):
         # Get the cache
         if topic not in self.index_cache:
             return
-        all_stamps = self.index_cache[topic]
+        topic_index = self.index_cache[topic]
+        all_stamps = topic_index.stamps
+
+        # Regions are cut at the last message before the right edge of the timeline
+        end_index = numpy.searchsorted(all_stamps, self._stamp_right)
+        if end_index == 0:
+            return
+        last_stamp = all_stamps[end_index - 1]
 
-#        start_index = bisect.bisect_left(all_stamps, self._stamp_left)
-        end_index = bisect.bisect_left(all_stamps, self._stamp_right)
         # Set pen based on datatype
         datatype_color = self._datatype_colors.get(datatype, self._default_datatype_color)
         # Iterate through regions of connected messages
         width_interval = self._history_width / (self._stamp_right - self._stamp_left)
 
         # Draw stamps
-        for (stamp_start, stamp_end) in self._find_regions(all_stamps[:end_index], self.map_dx_to_dstamp(self._default_msg_combine_px)):
-            if stamp_end < self._stamp_left:
-                continue
-
-            region_x_start = self._history_left + (stamp_start - self._stamp_left) * width_interval
-            if region_x_start < self._history_left:
-                region_x_start = self._history_left  # Clip the region
-            region_x_end = self._history_left + (stamp_end - self._stamp_left) * width_interval
-            region_width = max(1, region_x_end - region_x_start)
-
-            painter.setBrush(QBrush(datatype_color))
-            painter.setPen(QPen(datatype_color, 1))
+        stamp_starts, stamp_ends = topic_index.get_regions(self.map_dx_to_dstamp(self._default_msg_combine_px), self._stamp_left, self._stamp_right)
+        region_x_starts = numpy.maximum(self._history_left, self._history_left + (stamp_starts - self._stamp_left) * width_interval)  # Clip the regions
+        region_x_ends = self._history_left + (numpy.minimum(stamp_ends, last_stamp) - self._stamp_left) * width_interval
+        region_widths = numpy.maximum(1, region_x_ends - region_x_starts)
+
+        painter.setBrush(QBrush(datatype_color))
+        painter.setPen(QPen(datatype_color, 1))
+        for region_x_start, region_width in zip(region_x_starts.tolist(), region_widths.tolist()):
             painter.drawRect(region_x_start, msg_y, region_width, msg_height)
 
         # Draw active message
@@ -392,7 +387,7 @@ class TimelineFrame(QGraphicsItem):
             curpen.setWidth(self._active_message_line_width)
             painter.setPen(curpen)
             playhead_stamp = None
-            playhead_index = bisect.bisect_right(all_stamps, self.playhead.to_sec()) - 1
+            playhead_index = numpy.searchsorted(all_stamps, self.playhead.to_sec(), 'right') - 1
             if playhead_index >= 0:
                 playhead_stamp = all_stamps[playhead_index]
                 if playhead_stamp > self._stamp_left and playhead_stamp < self._stamp_right:
@@ -404,13 +399,11 @@ class TimelineFrame(QGraphicsItem):
         # Custom renderer
         if renderer:
             # Iterate through regions of connected messages
-            for (stamp_start, stamp_end) in self._find_regions(all_stamps[:end_index], msg_combine_interval):
-                if stamp_end < self._stamp_left:
-                    continue
-
-                region_x_start = self._history_left + (stamp_start - self._stamp_left) * width_interval
-                region_x_end = self._history_left + (stamp_end - self._stamp_left) * width_interval
-                region_width = max(1, region_x_end - region_x_start)
+            stamp_starts, stamp_ends = topic_index.get_regions(msg_combine_interval, self._stamp_left, self._stamp_right)
+            stamp_ends = numpy.minimum(stamp_ends, last_stamp)
+            region_x_starts = self._history_left + (stamp_starts - self._stamp_left) * width_interval
+            region_widths = numpy.maximum(1, (stamp_ends - stamp_starts) * width_interval)
+            for stamp_start, stamp_end, region_x_start, region_width in zip(stamp_starts.tolist(), stamp_ends.tolist(), region_x_starts.tolist(), region_widths.tolist()):
                 renderer.draw_timeline_segment(painter, topic, stamp_start, stamp_end, region_x_start, msg_y, region_width, msg_height)
 
         painter.setBrush(self._default_brush)
@@ -714,63 +707,59 @@ class TimelineFrame(QGraphicsItem):
 
     # Index Caching functions
 
-    def _update_index_cache(self, topic):
+    def _load_index_cache(self, topic, topic_cache):
         """
-        Updates the cache of message timestamps for the given topic.
-        :return: number of messages added to the index cache
+        Loads the message timestamps for the given topic which are missing from its cache.
+        Doesn't modify the cache, so it can run concurrently for several topics without holding index_cache_cv.
+        :param topic_cache: current cache of the topic, or None, ''TopicIndex''
+        :return: cache to publish for the topic and the stamps to append to it, or None, ''(TopicIndex, list(float))''
         """
         if self._start_stamp is None or self._end_stamp is None:
-            return 0
+            return None
+
+        if topic_cache is None:
+            # Don't have any cache of messages in this topic; try the bag indexes first
+            topic_stamps = self.scene().get_stamps(topic)
+            if topic_stamps is not None:
+                return TopicIndex(topic_stamps), []
 
-        if topic not in self.index_cache:
-            # Don't have any cache of messages in this topic
             start_time = self._start_stamp
-            topic_cache = []
-            self.index_cache[topic] = topic_cache
+            topic_cache = TopicIndex()
+        elif len(topic_cache) == 0:
+            start_time = self._start_stamp
         else:
-            topic_cache = self.index_cache[topic]
-
-            # Check if the cache has been invalidated
-            if topic not in self.invalidated_caches:
-                return 0
-
-            if len(topic_cache) == 0:
-                start_time = self._start_stamp
-            else:
-                start_time = rospy.Time.from_sec(max(0.0, topic_cache[-1]))
+            start_time = rospy.Time.from_sec(max(0.0, float(topic_cache[-1])))
 
         end_time = self._end_stamp
 
-        topic_cache_len = len(topic_cache)
+        new_stamps = [entry.time.to_sec() for entry in self.scene().get_entries(topic, start_time, end_time)]
 
-        for entry in self.scene().get_entries(topic, start_time, end_time):
-            topic_cache.append(entry.time.to_sec())
+        return topic_cache, new_stamps
 
-        if topic in self.invalidated_caches:
-            self.invalidated_caches.remove(topic)
-
-        return len(topic_cache) - topic_cache_len
-
-    def _find_regions(self, stamps, max_interval):
+    def _publish_index_cache(self, topic, base_cache, bag_count, update):
         """
-        Group timestamps into regions connected by timestamps less than max_interval secs apart
-        :param start_stamp: a list of stamps, ''list''
-        :param stamp_step: seconds between each division, ''int''
+        Atomically replaces or extends the cache of message timestamps for the given topic.
+        Must be called with index_cache_cv held.
+        :param base_cache: cache of the topic when the update was loaded, ''TopicIndex''
+        :param bag_count: number of bags when the update was loaded, ''int''
+        :param update: result of _load_index_cache, ''(TopicIndex, list(float))''
+        :return: number of messages added to the index cache
         """
-        region_start, prev_stamp = None, None
-        for stamp in stamps:
-            if prev_stamp:
-                if stamp - prev_stamp > max_interval:
-                    region_end = prev_stamp
-                    yield (region_start, region_end)
-                    region_start = stamp
-            else:
-                region_start = stamp
+        if update is None:
+            return 0
+
+        # Bags were added or the cache was reset while loading; index the topic again
+        if len(self.scene()._bags) != bag_count or self.index_cache.get(topic) is not base_cache:
+            self.invalidated_caches.add(topic)
+            return 0
 
-            prev_stamp = stamp
+        topic_cache, new_stamps = update
+        topic_cache.extend(new_stamps)
+        self.index_cache[topic] = topic_cache
 
-        if region_start and prev_stamp:
-            yield (region_start, prev_stamp)
+        if topic_cache is base_cache:
+            return len(new_stamps)
+        return len(topic_cache)
 
     def _get_stamps(self, start_stamp, stamp_step):
         """
@@ -110,6 +110,11 @@ class TimelinePopupMenu(QMenu):
             self._publish_actions.append(submenu.addAction(topic))
             self._publish_actions[-1].setCheckable(True)
             self._publish_actions[-1].setChecked(self.timeline.is_publishing(topic))
+        submenu.addSeparator()
+
+        self._publish_clock = submenu.addAction('/clock')
+        self._publish_clock.setCheckable(True)
+        self._publish_clock.setChecked(self.timeline.is_publishing_clock())
 
         action = self.exec_(event.globalPos())
         if action is not None and action != 0:
@@ -155,6 +160,11 @@ class TimelinePopupMenu(QMenu):
                 self.timeline.get_context().add_widget(frame)
                 self.timeline.add_view(action.parentWidget().title(), view, frame)
                 frame.show()
+        elif action == self._publish_clock:
+            if self.timeline.is_publishing_clock():
+                self.timeline.stop_publishing_clock()
+            else:
+                self.timeline.start_publishing_clock()
         elif action in self._publish_actions:
             if self.timeline.is_publishing(action.text()):
                 self.timeline.stop_publishing(action.text())
@@ -0,0 +1,144 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import math
+
+import numpy
+
+
+class TopicIndex(object):
+    """
+    Sorted message timestamps (in seconds) of a topic, stored in a contiguous float64 array.
+
+    The array grows geometrically so appends while recording are amortized O(1).
+    Readers get a consistent view of the stamps without locking.
+
+    Also keeps a pyramid of message regions, one level per zoom bucket, for drawing the timeline.
+    """
+    _growth_factor = 1.5
+    _min_capacity = 1024
+    _max_region_levels = 8
+
+    def __init__(self, stamps=None):
+        """
+        :param stamps: initial sorted stamps, used without copying, ''numpy.array''
+        """
+        if stamps is None:
+            stamps = numpy.empty(0, dtype=numpy.float64)
+        # The array and the number of stamps used in it are published together in a single assignment, so readers
+        # always see a size which matches the array
+        self._data = (stamps, len(stamps))
+        self._regions = collections.OrderedDict()  # zoom bucket -> (size, max interval, starts, ends)
+
+    def __len__(self):
+        return self._data[1]
+
+    def __getitem__(self, index):
+        return self.stamps[index]
+
+    @property
+    def stamps(self):
+        """
+        :returns: view of the stored stamps, ''numpy.array''
+        """
+        stamps, size = self._data
+        return stamps[:size]
+
+    def extend(self, stamps):
+        """
+        Appends stamps, which must not be earlier than the last stored stamp
+        :param stamps: stamps to append, ''list(float)''
+        """
+        stamps = numpy.asarray(stamps, dtype=numpy.float64)
+        if len(stamps) == 0:
+            return
+        data, size = self._data
+        new_size = size + len(stamps)
+        if new_size > len(data):
+            capacity = max(new_size, int(len(data) * self._growth_factor), self._min_capacity)
+            grown = numpy.empty(capacity, dtype=numpy.float64)
+            grown[:size] = data[:size]
+            data = grown
+        # Stamps past the published size aren't visible to readers until the new size is published
+        data[size:new_size] = stamps
+        self._data = (data, new_size)
+
+    def get_regions(self, max_interval, start_stamp=None, end_stamp=None):
+        """
+        Groups stamps into regions connected by stamps at most max_interval secs apart.
+
+        max_interval is rounded down to a zoom bucket (a power of sqrt(2)) and the regions of each bucket are cached
+        until new stamps are added. Coarser levels are built by merging the regions of the nearest finer cached level.
+        :param max_interval: maximum gap in seconds between stamps in the same region, ''float''
+        :param start_stamp: only return regions ending at or after this stamp, ''float''
+        :param end_stamp: only return regions starting before this stamp, ''float''
+        :returns: start and end stamps of the regions, ''(numpy.array, numpy.array)''
+        """
+        if max_interval > 0.0:
+            bucket = int(math.floor(2.0 * math.log(max_interval, 2)))
+        else:
+            bucket = None
+        starts, ends = self._get_region_level(bucket)
+
+        start_index = 0 if start_stamp is None else numpy.searchsorted(ends, start_stamp, 'left')
+        end_index = len(starts) if end_stamp is None else numpy.searchsorted(starts, end_stamp, 'left')
+        return starts[start_index:end_index], ends[start_index:end_index]
+
+    def _get_region_level(self, bucket):
+        stamps, size = self._data
+        stamps = stamps[:size]
+
+        level = self._regions.get(bucket)
+        if level is not None and level[0] == size:
+            return level[2], level[3]
+
+        max_interval = 0.0 if bucket is None else 2.0 ** (bucket / 2.0)
+
+        # Merge the regions of the nearest finer level which is up-to-date, otherwise start from the stamps
+        starts = ends = stamps
+        finer_interval = -1.0
+        for level_size, level_interval, level_starts, level_ends in self._regions.values():
+            if level_size == size and finer_interval < level_interval < max_interval:
+                finer_interval, starts, ends = level_interval, level_starts, level_ends
+
+        if len(starts) > 1:
+            breaks = (starts[1:] - ends[:-1]) > max_interval
+            starts = starts[numpy.concatenate(([True], breaks))]
+            ends = ends[numpy.concatenate((breaks, [True]))]
+
+        self._regions.pop(bucket, None)
+        self._regions[bucket] = (size, max_interval, starts, ends)
+        while len(self._regions) > self._max_region_levels:
+            self._regions.popitem(last=False)
+
+        return starts, ends
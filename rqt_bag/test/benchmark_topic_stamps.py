@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Compares building the timeline stamps of a topic from the index entries, as TimelineFrame did through
+BagTimeline.get_entries, with bag_helper.get_topic_stamps, on a synthetic connection index.
+"""
+
+import argparse
+import time
+
+import numpy
+import rospy
+
+from rqt_bag import bag_helper
+
+from fake_bag import FakeBag
+
+
+def _create_bag(num_entries, num_connections):
+    random = numpy.random.RandomState(0)
+    per_connection = num_entries // num_connections
+    connection_times = []
+    for _ in range(num_connections):
+        secs = 1300000000 + numpy.arange(per_connection) // 100
+        nsecs = numpy.sort(random.randint(0, 1000000000, per_connection))
+        connection_times.append(('/topic', [rospy.Time(int(s), int(n)) for s, n in zip(secs, nsecs)]))
+    return FakeBag(connection_times=connection_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=1000000, help='number of index entries')
+    parser.add_argument('--connections', type=int, default=4, help='number of connections on the topic')
+    args = parser.parse_args()
+
+    print('Building an index of %d entries on %d connections...' % (args.entries, args.connections))
+    bag = _create_bag(args.entries, args.connections)
+
+    start = time.time()
+    entry_stamps = [entry.time.to_sec() for entry in bag._get_entries(bag._get_connections('/topic'))]
+    entries_duration = time.time() - start
+
+    start = time.time()
+    bulk_stamps = bag_helper.get_topic_stamps(bag, '/topic')
+    bulk_duration = time.time() - start
+
+    print('index entries:    %.3fs' % entries_duration)
+    print('get_topic_stamps: %.3fs (%.1fx)' % (bulk_duration, entries_duration / bulk_duration))
+    print('identical stamps: %s' % (bulk_stamps.tolist() == entry_stamps))
+
+
+if __name__ == '__main__':
+    main()
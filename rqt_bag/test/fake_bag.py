@@ -0,0 +1,102 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Stand-ins for rosbag.Bag and its connection index, shared by the tests and benchmarks of rqt_bag.
+"""
+
+import heapq
+
+
+class FakeConnection(object):
+    def __init__(self, id, topic, datatype='test_msgs/Data', md5sum='0123456789abcdef'):
+        self.id = id
+        self.topic = topic
+        self.datatype = datatype
+        self.md5sum = md5sum
+
+
+class FakeIndexEntry(object):
+    __slots__ = ('time', 'chunk_pos', 'offset')
+
+    def __init__(self, time, chunk_pos=0, offset=0):
+        self.time = time
+        self.chunk_pos = chunk_pos
+        self.offset = offset
+
+    @property
+    def position(self):
+        return (self.chunk_pos, self.offset)
+
+    def __lt__(self, other):
+        return self.time < other.time
+
+
+class FakeMessage(object):
+    def deserialize(self, data):
+        self.data = data
+
+
+class FakeBag(object):
+    """
+    Stands in for a rosbag.Bag opened for reading, with an in-memory index for each connection.
+    """
+    version = 200
+
+    def __init__(self, filename=None, connection_times=()):
+        """
+        :param filename: path of the bag file, ''str''
+        :param connection_times: topic and sorted times of the messages of each connection, ''list((str, list(rospy.Time)))''
+        """
+        self.filename = filename
+        self.mode = 'r'
+        self._connections = {}
+        self._connection_indexes = {}
+        for id, (topic, times) in enumerate(connection_times):
+            self._connections[id] = FakeConnection(id, topic)
+            self._connection_indexes[id] = [FakeIndexEntry(t, i, id) for i, t in enumerate(times)]
+
+    def add_connection(self, id, topic):
+        self._connections[id] = FakeConnection(id, topic)
+        self._connection_indexes.setdefault(id, [])
+
+    def _get_connections(self, topics=None):
+        if isinstance(topics, str):
+            topics = [topics]
+        return [c for c in self._connections.values() if topics is None or c.topic in topics]
+
+    def _get_entries(self, connections):
+        # Merges the connections in time order, like rosbag's _mergesort
+        return heapq.merge(*[self._connection_indexes[c.id] for c in connections])
+
+    def _get_message_type(self, connection):
+        return FakeMessage
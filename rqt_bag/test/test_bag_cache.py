@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import unittest
+
+from rqt_bag.bag_cache import BagCache
+
+from fake_bag import FakeBag
+
+
+class TestBagCache(unittest.TestCase):
+
+    def setUp(self):
+        self._bag = FakeBag('a.bag')
+        self._cache = BagCache(100)
+
+    def test_get_and_put(self):
+        self.assertIsNone(self._cache.get(self._bag, (0, 1)))
+        self._cache.put(self._bag, (0, 1), 'msg', 10)
+        self.assertTrue(self._cache.contains(self._bag, (0, 1)))
+        self.assertEqual(self._cache.get(self._bag, (0, 1)), 'msg')
+        self.assertEqual((self._cache.hits, self._cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used_over_byte_budget(self):
+        for i in range(4):
+            self._cache.put(self._bag, i, i, 30)
+        # 120 bytes over a 100 byte budget, so the first item is evicted
+        self.assertEqual(self._cache.nbytes, 90)
+        self.assertFalse(self._cache.contains(self._bag, 0))
+
+        self._cache.get(self._bag, 1)
+        self._cache.put(self._bag, 4, 4, 30)
+        self.assertFalse(self._cache.contains(self._bag, 2))
+        self.assertTrue(self._cache.contains(self._bag, 1))
+        self.assertEqual(self._cache.nbytes, 90)
+
+    def test_item_over_budget_not_kept(self):
+        self._cache.put(self._bag, 0, 'big', 101)
+        self.assertEqual(len(self._cache), 0)
+        self.assertEqual(self._cache.nbytes, 0)
+
+    def test_replace_item(self):
+        self._cache.put(self._bag, 0, 'old', 60)
+        self._cache.put(self._bag, 0, 'new', 20)
+        self.assertEqual(self._cache.nbytes, 20)
+        self.assertEqual(self._cache.get(self._bag, 0), 'new')
+
+    def test_lower_byte_budget_evicts(self):
+        for i in range(3):
+            self._cache.put(self._bag, i, i, 30)
+        self._cache.byte_budget = 40
+        self.assertEqual(len(self._cache), 1)
+        self.assertTrue(self._cache.contains(self._bag, 2))
+
+    def test_reopened_bag_at_same_path_does_not_hit(self):
+        self._cache.put(self._bag, 0, 'old', 10)
+        reopened_bag = FakeBag(self._bag.filename)
+        self.assertIsNone(self._cache.get(reopened_bag, 0))
+
+    def test_remove_bag(self):
+        other_bag = FakeBag('b.bag')
+        self._cache.put(self._bag, 0, 'a', 10)
+        self._cache.put(other_bag, 0, 'b', 20)
+        self._cache.remove_bag(self._bag)
+        self.assertFalse(self._cache.contains(self._bag, 0))
+        self.assertTrue(self._cache.contains(other_bag, 0))
+        self.assertEqual(self._cache.nbytes, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
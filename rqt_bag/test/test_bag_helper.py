@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import unittest
+
+import numpy
+import rospy
+
+from rqt_bag import bag_helper
+
+from fake_bag import FakeBag
+
+
+class TestBagHelper(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        connection_times = []
+        for _ in range(3):
+            secs = 1300000000 + numpy.sort(random.randint(0, 1000, 500))
+            nsecs = random.randint(0, 1000000000, 500)
+            connection_times.append(sorted(rospy.Time(int(s), int(n)) for s, n in zip(secs, nsecs)))
+        # Two connections on /a, as when two nodes publish the same topic
+        self._bag = FakeBag(connection_times=zip(['/a', '/a', '/b'], connection_times))
+
+    def test_connection_stamps_equal_to_sec(self):
+        for id, index in self._bag._connection_indexes.items():
+            expected = [entry.time.to_sec() for entry in index]
+            self.assertEqual(bag_helper.get_connection_stamps(self._bag, id).tolist(), expected)
+
+    def test_connection_positions(self):
+        for id, index in self._bag._connection_indexes.items():
+            chunk_positions, offsets = bag_helper.get_connection_positions(self._bag, id)
+            self.assertEqual(zip(chunk_positions.tolist(), offsets.tolist()), [entry.position for entry in index])
+
+    def test_topic_stamps_equal_entries(self):
+        for topic in ['/a', '/b']:
+            expected = [entry.time.to_sec() for entry in self._bag._get_entries(self._bag._get_connections(topic))]
+            self.assertEqual(bag_helper.get_topic_stamps(self._bag, topic).tolist(), expected)
+
+    def test_topic_stamps_of_missing_topic(self):
+        self.assertEqual(len(bag_helper.get_topic_stamps(self._bag, '/c')), 0)
+
+    def test_connection_entries(self):
+        index = self._bag._connection_indexes[0]
+        start_stamp, end_stamp = index[100].time, index[200].time
+        count, entries = bag_helper.get_connection_entries(self._bag, 0, start_stamp, end_stamp)
+        expected = [entry for entry in index if start_stamp <= entry.time <= end_stamp]
+        self.assertEqual(count, len(expected))
+        self.assertEqual(list(entries), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import bz2
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+
+from rqt_bag.bag_cache import BagCache
+from rqt_bag.bag_reader import BagReader, MmapBagReader
+
+from fake_bag import FakeBag
+
+
+def _create_record(fields, data):
+    header = ''.join(struct.pack('<I', len(name) + 1 + len(value)) + name + '=' + value for name, value in fields)
+    return struct.pack('<I', len(header)) + header + struct.pack('<I', len(data)) + data
+
+
+def _create_message_record(connection_id, secs, nsecs, data):
+    return _create_record([('op', '\x02'), ('conn', struct.pack('<I', connection_id)), ('time', struct.pack('<II', secs, nsecs))], data)
+
+
+def _create_chunk_record(compression, chunk):
+    if compression == 'bz2':
+        data = bz2.compress(chunk)
+    else:
+        data = chunk
+    return _create_record([('op', '\x05'), ('compression', compression), ('size', struct.pack('<I', len(chunk)))], data)
+
+
+class TestBagReader(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+
+        # Each chunk holds a connection record followed by two messages
+        connection_record = _create_record([('op', '\x07'), ('conn', struct.pack('<I', 3)), ('topic', '/a')], 'definition')
+        first_record = _create_message_record(3, 5, 7, 'first')
+        second_record = _create_message_record(3, 6, 8, 'second')
+        chunk = connection_record + first_record + second_record
+        self._second_offset = len(connection_record) + len(first_record)
+        self._chunk_length = len(chunk)
+
+        records = ['#ROSBAG V2.0\n']
+        self._chunk_positions = {}
+        for compression in ['none', 'bz2']:
+            self._chunk_positions[compression] = sum(len(record) for record in records)
+            records.append(_create_chunk_record(compression, chunk))
+        filename = os.path.join(self._tmp_dir, 'test.bag')
+        with open(filename, 'wb') as f:
+            f.write(''.join(records))
+        self._bag = FakeBag(filename)
+        self._bag.add_connection(3, '/a')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _check_reader(self, reader):
+        for compression, chunk_pos in self._chunk_positions.items():
+            topic, msg, stamp = reader.read_message((chunk_pos, 0))
+            self.assertEqual((topic, msg.data, stamp.secs, stamp.nsecs), ('/a', 'first', 5, 7))
+
+            topic, msg, stamp = reader.read_message((chunk_pos, self._second_offset), raw=True)
+            datatype, data, md5sum, position, _ = msg
+            self.assertEqual((topic, datatype, data, md5sum, position), ('/a', 'test_msgs/Data', 'second', '0123456789abcdef', (chunk_pos, self._second_offset)))
+            self.assertEqual((stamp.secs, stamp.nsecs), (6, 8))
+
+    def test_supports(self):
+        self.assertTrue(BagReader.supports(self._bag))
+        self._bag.mode = 'w'
+        self.assertFalse(BagReader.supports(self._bag))
+
+    def test_read_message(self):
+        reader = BagReader(self._bag)
+        self._check_reader(reader)
+        reader.close()
+
+    def test_read_messages_in_threads(self):
+        reader = BagReader(self._bag)
+        positions = [(chunk_pos, offset) for chunk_pos in self._chunk_positions.values() for offset in [0, self._second_offset]]
+        results = []
+
+        def read():
+            results.append([msg.data for _, msg, _ in reader.read_messages(positions)])
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reader.close()
+
+        self.assertEqual(results, [['first', 'second'] * 2] * 4)
+
+    def test_mmap_read_message(self):
+        reader = MmapBagReader(self._bag)
+        self._check_reader(reader)
+        reader.close()
+
+    def test_chunk_cache(self):
+        chunk_cache = BagCache(1024 * 1024)
+        reader = BagReader(self._bag, chunk_cache)
+        self._check_reader(reader)
+        self.assertEqual(len(chunk_cache), 2)
+        # Reading the chunks again hits the chunk cache
+        self._check_reader(reader)
+        self.assertEqual(chunk_cache.hits, 6)
+        reader.close()
+
+    def test_chunk_cache_byte_budget(self):
+        # Only one decompressed chunk fits in the budget
+        chunk_cache = BagCache(self._chunk_length * 3 // 2)
+        reader = BagReader(self._bag, chunk_cache)
+        self._check_reader(reader)
+        self.assertEqual(len(chunk_cache), 1)
+        self.assertEqual(chunk_cache.nbytes, self._chunk_length)
+        reader.close()
+
+    def test_mmap_caches_only_compressed_chunks(self):
+        chunk_cache = BagCache(1024 * 1024)
+        reader = MmapBagReader(self._bag, chunk_cache)
+        self._check_reader(reader)
+        # Uncompressed chunks are read from the mapping
+        self.assertEqual(len(chunk_cache), 1)
+        self.assertFalse(chunk_cache.contains(self._bag, self._chunk_positions['none']))
+        reader.close()
+
+    def test_not_a_chunk(self):
+        reader = BagReader(self._bag)
+        self.assertRaises(ValueError, reader.read_message, (self._chunk_positions['none'] + 1, 0))
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
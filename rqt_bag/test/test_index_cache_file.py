@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import rospy
+
+from rqt_bag import index_cache_file
+
+from fake_bag import FakeBag
+
+
+class TestIndexCacheFile(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._ros_home = os.environ.get('ROS_HOME')
+        os.environ['ROS_HOME'] = os.path.join(self._tmp_dir, 'ros_home')
+
+    def tearDown(self):
+        if self._ros_home is None:
+            del os.environ['ROS_HOME']
+        else:
+            os.environ['ROS_HOME'] = self._ros_home
+        shutil.rmtree(self._tmp_dir)
+
+    def _create_bag(self, name, topic_stamps):
+        filename = os.path.join(self._tmp_dir, name)
+        with open(filename, 'wb') as f:
+            f.write('bag %s' % name)
+        connection_times = [(topic, [rospy.Time.from_sec(stamp) for stamp in stamps]) for topic, stamps in sorted(topic_stamps.items())]
+        return FakeBag(filename, connection_times)
+
+    def test_save_and_load(self):
+        bag = self._create_bag('a.bag', {'/a': [1.0, 2.5], '/b': [], '/c': [3.0]})
+        index = dict((topic, index_cache_file.build_topic_index(bag, topic)) for topic in ['/a', '/b', '/c'])
+        index_cache_file.save_index(bag, index)
+
+        loaded = index_cache_file.load_index(bag)
+        self.assertEqual(sorted(loaded.keys()), ['/a', '/b', '/c'])
+        for topic, stamps in index.items():
+            numpy.testing.assert_array_equal(loaded[topic], stamps)
+
+    def test_invalidated_by_size_change(self):
+        bag = self._create_bag('a.bag', {'/a': [1.0]})
+        index_cache_file.save_index(bag, {'/a': index_cache_file.build_topic_index(bag, '/a')})
+        st = os.stat(bag.filename)
+        with open(bag.filename, 'ab') as f:
+            f.write('more data')
+        os.utime(bag.filename, (st.st_atime, st.st_mtime))
+        self.assertIsNone(index_cache_file.load_index(bag))
+
+    def test_invalidated_by_mtime_change(self):
+        bag = self._create_bag('a.bag', {'/a': [1.0]})
+        index_cache_file.save_index(bag, {'/a': index_cache_file.build_topic_index(bag, '/a')})
+        st = os.stat(bag.filename)
+        os.utime(bag.filename, (st.st_atime, st.st_mtime + 10.0))
+        self.assertIsNone(index_cache_file.load_index(bag))
+
+    def test_not_loaded_for_bag_being_written(self):
+        bag = self._create_bag('a.bag', {'/a': [1.0]})
+        index_cache_file.save_index(bag, {'/a': index_cache_file.build_topic_index(bag, '/a')})
+        bag.mode = 'w'
+        self.assertIsNone(index_cache_file.load_index(bag))
+
+    def test_bag_stamp_index_saved_once_complete(self):
+        bag = self._create_bag('a.bag', {'/a1': [1.0, 2.0], '/a2': [1.5]})
+        bag_index = index_cache_file.BagStampIndex(bag)
+
+        bag_index.get_stamps('/a1')
+        self.assertFalse(bag_index.save_if_complete())
+        self.assertIsNone(index_cache_file.load_index(bag))
+
+        bag_index.get_stamps('/a2')
+        self.assertTrue(bag_index.save_if_complete())
+        self.assertFalse(bag_index.save_if_complete())
+
+        loaded = index_cache_file.BagStampIndex(bag)
+        numpy.testing.assert_array_equal(loaded.get_stamps('/a1'), [1.0, 2.0])
+        numpy.testing.assert_array_equal(loaded.get_stamps('/a2'), [1.5])
+        self.assertFalse(loaded.save_if_complete())
+
+    def test_two_bags_with_different_topics(self):
+        bag_a = self._create_bag('a.bag', {'/a1': [1.0], '/a2': [2.0], '/a3': [3.0]})
+        bag_b = self._create_bag('b.bag', {'/b1': [1.5], '/b2': [2.5], '/b3': [3.5]})
+        bag_indexes = [index_cache_file.BagStampIndex(bag_a), index_cache_file.BagStampIndex(bag_b)]
+
+        # Index the topics of the second bag first, as the timeline does for all topics in all bags
+        for topic in ['/b1', '/b2', '/b3']:
+            for bag_index in bag_indexes:
+                bag_index.get_stamps(topic)
+                bag_index.save_if_complete()
+        self.assertEqual(len(bag_indexes[0].get_stamps('/b1')), 0)
+        self.assertIsNone(index_cache_file.load_index(bag_a))
+        self.assertEqual(sorted(index_cache_file.load_index(bag_b).keys()), ['/b1', '/b2', '/b3'])
+
+        for topic in ['/a1', '/a2', '/a3']:
+            for bag_index in bag_indexes:
+                bag_index.get_stamps(topic)
+                bag_index.save_if_complete()
+        self.assertEqual(sorted(index_cache_file.load_index(bag_a).keys()), ['/a1', '/a2', '/a3'])
+        self.assertEqual(sorted(index_cache_file.load_index(bag_b).keys()), ['/b1', '/b2', '/b3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+
+import collections
+import threading
+import unittest
+
+from rqt_bag import message_loader
+from rqt_bag.message_loader import MessageLoader
+
+from fake_bag import FakeBag, FakeMessage
+
+
+class _Timeline(object):
+    """
+    Stands in for a BagTimeline whose reads block until the test releases them.
+    """
+    def __init__(self, listeners):
+        """
+        :param listeners: listeners of each topic, ''dict(str, list(object))''
+        """
+        self._listeners = listeners
+        self.play_speed = 0.0
+        self.reads = []  # (topic, position) of each read message
+        self.read_started = threading.Semaphore(0)
+        self.release = threading.Event()
+        self._loading = collections.Counter()
+        self.max_loading = collections.Counter()  # topic -> most reads in progress at once
+        self._lock = threading.Lock()
+
+    def has_listeners(self, topic):
+        return bool(self._listeners.get(topic))
+
+    def read_message(self, bag, position, raw=False):
+        topic, _ = position
+        with self._lock:
+            self.reads.append(position)
+            self._loading[topic] += 1
+            self.max_loading[topic] = max(self.max_loading[topic], self._loading[topic])
+        self.read_started.release()
+        self.release.wait()
+        with self._lock:
+            self._loading[topic] -= 1
+        return topic, (None, 'data', None, None, FakeMessage), None
+
+
+class TestMessageLoader(unittest.TestCase):
+
+    def setUp(self):
+        self._posted = []  # (listener, (bag, msg data)) of each posted event
+        self._posted_cv = threading.Condition()
+        self._post_event = message_loader.QCoreApplication.postEvent
+        message_loader.QCoreApplication.postEvent = staticmethod(self._record_event)
+        self._bag = FakeBag('a.bag')
+        self._loader = None
+
+    def tearDown(self):
+        message_loader.QCoreApplication.postEvent = self._post_event
+        if self._loader:
+            self._loader.stop()
+
+    def _record_event(self, listener, event):
+        with self._posted_cv:
+            self._posted.append((listener, event.data))
+            self._posted_cv.notify_all()
+
+    def _wait_for_posted(self, count):
+        with self._posted_cv:
+            while len(self._posted) < count:
+                self._posted_cv.wait(5.0)
+            return list(self._posted)
+
+    def _start(self, listeners, num_workers):
+        self._timeline = _Timeline(listeners)
+        self._loader = MessageLoader(self._timeline, num_workers=num_workers)
+
+    def test_coalesces_playhead_positions_per_topic(self):
+        self._start({'/a': ['view']}, num_workers=4)
+        self._loader.set_playhead_position('/a', (self._bag, ('/a', 0)))
+        self._timeline.read_started.acquire()
+
+        # Positions set while the topic is loading are coalesced into the latest one
+        for i in range(1, 10):
+            self._loader.set_playhead_position('/a', (self._bag, ('/a', i)))
+        self._timeline.release.set()
+
+        posted = self._wait_for_posted(2)
+        self.assertEqual(self._timeline.reads, [('/a', 0), ('/a', 9)])
+        self.assertEqual([msg_data[0] for _, (_, msg_data) in posted], ['/a', '/a'])
+        self.assertEqual(self._timeline.max_loading['/a'], 1)
+
+    def test_loads_topics_in_parallel(self):
+        self._start({'/a': ['view a'], '/b': ['view b']}, num_workers=2)
+        self._loader.set_playhead_position('/a', (self._bag, ('/a', 0)))
+        self._loader.set_playhead_position('/b', (self._bag, ('/b', 0)))
+
+        # Both topics are read before either read is released
+        self._timeline.read_started.acquire()
+        self._timeline.read_started.acquire()
+        self._timeline.release.set()
+
+        posted = self._wait_for_posted(2)
+        self.assertEqual(sorted(listener for listener, _ in posted), ['view a', 'view b'])
+
+    def test_skips_topics_without_listeners(self):
+        self._start({'/a': ['view']}, num_workers=1)
+        self._timeline.release.set()
+        self._loader.set_playhead_position('/b', (self._bag, ('/b', 0)))
+        self._loader.set_playhead_position('/a', (self._bag, ('/a', 0)))
+
+        self._wait_for_posted(1)
+        self.assertEqual(self._timeline.reads, [('/a', 0)])
+
+    def test_position_delivered_once_per_listener(self):
+        self._start({'/a': ['view']}, num_workers=1)
+        self._timeline.release.set()
+        self._loader.set_playhead_position('/a', (self._bag, ('/a', 0)))
+        self._wait_for_posted(1)
+
+        # Already delivered, so a reset doesn't post it again until there is a new listener
+        self._loader.reset('/a')
+        self._timeline._listeners['/a'].append('new view')
+        self._loader.reset('/a')
+        posted = self._wait_for_posted(2)
+        self.assertEqual([listener for listener, _ in posted], ['view', 'new view'])
+
+        # The second post comes from the message cache
+        self.assertEqual(self._timeline.reads, [('/a', 0)])
+
+    def test_no_message_at_playhead(self):
+        self._start({'/a': ['view']}, num_workers=1)
+        self._loader.set_playhead_position('/a', (None, None))
+        self.assertEqual(self._wait_for_posted(1), [('view', (None, None))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import time
+import unittest
+
+import numpy
+import rospy
+
+from rqt_bag import player
+from rqt_bag.position_index import PositionIndex
+
+from fake_bag import FakeBag
+
+
+class _Publisher(object):
+    published = []
+
+    def __init__(self, topic, data_class):
+        self.topic = topic
+        self.data_class = data_class
+
+    def publish(self, msg):
+        self.published.append((self.topic, msg, time.time()))
+
+    def unregister(self):
+        pass
+
+
+class _Message(object):
+    _type = 'test_msgs/Data'
+
+    def __init__(self, stamp):
+        self.stamp = stamp
+
+
+class _TimelineFrame(object):
+    def __init__(self, play_region):
+        self.playhead = None
+        self.play_region = play_region
+
+
+class _Timeline(object):
+    """
+    Stands in for the BagTimeline the player publishes from, with one bag.
+    """
+    def __init__(self, topic_stamps, use_position_index=True):
+        connection_times = [(topic, [rospy.Time.from_sec(stamp) for stamp in stamps]) for topic, stamps in sorted(topic_stamps.items())]
+        self.bag = FakeBag(connection_times=connection_times)
+        self.play_speed = 0.0
+        all_times = [t for _, times in connection_times for t in times]
+        self._timeline_frame = _TimelineFrame((min(all_times), max(all_times)))
+        self._use_position_index = use_position_index
+
+    def get_entries_with_bags(self, topics, start_stamp, end_stamp):
+        entries = self.bag._get_entries(self.bag._get_connections(topics))
+        return ((self.bag, entry) for entry in entries if start_stamp <= entry.time <= end_stamp)
+
+    def get_position_index(self, topic):
+        if not self._use_position_index:
+            return None
+        stamps, chunk_positions, offsets = [], [], []
+        for connection in self.bag._get_connections(topic):
+            for entry in self.bag._connection_indexes[connection.id]:
+                stamps.append(entry.time.to_sec())
+                chunk_positions.append(entry.chunk_pos)
+                offsets.append(entry.offset)
+        return PositionIndex(stamps, numpy.zeros(len(stamps)), chunk_positions, offsets, [self.bag])
+
+    def read_message(self, bag, position, raw=False):
+        chunk_pos, connection_id = position
+        entry = bag._connection_indexes[connection_id][chunk_pos]
+        return bag._connections[connection_id].topic, _Message(entry.time), entry.time
+
+
+class TestPlayer(unittest.TestCase):
+
+    def setUp(self):
+        self._publisher_class = player.rospy.Publisher if hasattr(player.rospy, 'Publisher') else None
+        player.rospy.Publisher = _Publisher
+        _Publisher.published = []
+        self._player = None
+
+    def tearDown(self):
+        if self._player:
+            self._player.stop()
+        if self._publisher_class is None:
+            del player.rospy.Publisher
+        else:
+            player.rospy.Publisher = self._publisher_class
+
+    def _start_publishing(self, timeline, topics):
+        self._player = player.Player(timeline, raw=False)
+        for topic in topics:
+            self._player.start_publishing(topic)
+
+    def _count_skipped(self, timeline, topics, playhead, next_stamp):
+        _, entry = next(timeline.get_entries_with_bags(topics, rospy.Time.from_sec(next_stamp), timeline._timeline_frame.play_region[1]))
+        timeline._timeline_frame.playhead = rospy.Time.from_sec(playhead)
+        self._player._count_skipped(topics, entry)
+        return self._player.get_skipped_counts()
+
+    def test_count_skipped(self):
+        timeline = _Timeline({'/a': [1.0, 2.0, 3.0, 4.0], '/b': [1.5, 3.5]})
+        self._start_publishing(timeline, ['/a', '/b'])
+        self.assertEqual(self._count_skipped(timeline, ['/a', '/b'], 3.2, 2.0), {'/a': 2})
+        # The counts add up over re-anchors
+        self.assertEqual(self._count_skipped(timeline, ['/a', '/b'], 4.0, 3.5), {'/a': 2, '/b': 1})
+
+    def test_count_skipped_without_position_index(self):
+        timeline = _Timeline({'/a': [1.0, 2.0, 3.0, 4.0], '/b': [1.5, 3.5]}, use_position_index=False)
+        self._start_publishing(timeline, ['/a', '/b'])
+        self.assertEqual(self._count_skipped(timeline, ['/a', '/b'], 3.6, 1.5), {'/a': 2, '/b': 2})
+
+    def test_nothing_skipped_when_playhead_moves_back(self):
+        timeline = _Timeline({'/a': [1.0, 2.0, 3.0, 4.0]})
+        self._start_publishing(timeline, ['/a'])
+        self.assertEqual(self._count_skipped(timeline, ['/a'], 1.0, 3.0), {})
+
+    def test_publishes_every_message_on_schedule(self):
+        stamps = [1.0 + 0.05 * i for i in range(20)]
+        timeline = _Timeline({'/a': stamps})
+        self._start_publishing(timeline, ['/a'])
+
+        # Let the player start at the first message, then move the playhead at 4x like the timeline does while playing
+        play_speed = 4.0
+        timeline._timeline_frame.playhead = rospy.Time.from_sec(stamps[0])
+        timeline.play_speed = play_speed
+        time.sleep(0.1)
+        start_time = time.time()
+        while len(_Publisher.published) < len(stamps) and time.time() - start_time < 5.0:
+            elapsed = time.time() - start_time
+            timeline._timeline_frame.playhead = rospy.Time.from_sec(min(stamps[-1], stamps[0] + elapsed * play_speed))
+            time.sleep(0.005)
+
+        self.assertEqual([msg.stamp for _, msg, _ in _Publisher.published], [rospy.Time.from_sec(stamp) for stamp in stamps])
+        publish_times = [publish_time for _, _, publish_time in _Publisher.published]
+        for stamp, publish_time in zip(stamps, publish_times):
+            expected_time = publish_times[0] + (stamp - stamps[0]) / play_speed
+            self.assertAlmostEqual(publish_time, expected_time, delta=0.05)
+        self.assertEqual(self._player.get_skipped_counts(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import unittest
+
+from rqt_bag.position_index import PositionIndex
+
+
+class TestPositionIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Two bags with interleaved messages, and two messages with the same stamp
+        self._position_index = PositionIndex([3.0, 1.0, 2.0, 2.0, 5.0], [1, 0, 0, 1, 0], [30, 10, 20, 20, 50], [3, 1, 2, 2, 5], ['a', 'b'])
+
+    def test_len(self):
+        self.assertEqual(len(self._position_index), 5)
+
+    def test_lookup(self):
+        self.assertEqual(self._position_index.lookup(0.5), (None, None))
+        self.assertEqual(self._position_index.lookup(1.0), ('a', (10, 1)))
+        self.assertEqual(self._position_index.lookup(2.5), ('b', (20, 2)))
+        self.assertEqual(self._position_index.lookup(4.9), ('b', (30, 3)))
+        self.assertEqual(self._position_index.lookup(100.0), ('a', (50, 5)))
+
+    def test_lookup_keeps_order_of_equal_stamps(self):
+        self.assertEqual(self._position_index.lookup(2.0), ('b', (20, 2)))
+
+    def test_count(self):
+        self.assertEqual(self._position_index.count(0.0, 10.0), 5)
+        self.assertEqual(self._position_index.count(2.0, 3.0), 2)
+        self.assertEqual(self._position_index.count(2.0, 3.5), 3)
+        self.assertEqual(self._position_index.count(4.0, 2.0), 0)
+
+    def test_lookup_without_chunks(self):
+        position_index = PositionIndex([1.0, 2.0], [0, 0], [100, 200], [-1, -1], ['a'])
+        self.assertEqual(position_index.lookup(1.5), ('a', 100))
+
+    def test_empty(self):
+        position_index = PositionIndex([], [], [], [], [])
+        self.assertEqual(position_index.lookup(1.0), (None, None))
+        self.assertEqual(position_index.count(0.0, 1.0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import random
+import unittest
+
+import rospy
+
+from rqt_bag.timeline_cache import TimelineCache, _StampSkipList, get_timeline_cache_stats
+
+
+class TestTimelineCache(unittest.TestCase):
+
+    def setUp(self):
+        self._cache = TimelineCache(lambda topic, stamp, details: (None, None), max_cache_bytes=30, sizeof=len)
+
+    def tearDown(self):
+        self._cache.stop()
+        self._cache.join()
+
+    def _cache_item(self, topic, stamp, item):
+        self._cache.cache_item(topic, rospy.Time.from_sec(stamp), item)
+
+    def test_get_closest_item(self):
+        self._cache_item('/a', 1.0, 'one')
+        self._cache_item('/a', 3.0, 'three')
+        self._cache_item('/b', 2.0, 'two')
+        self.assertEqual(self._cache.get_item('/a', 1.4, 0.5), 'one')
+        self.assertEqual(self._cache.get_item('/a', 2.7, 0.5), 'three')
+        self.assertIsNone(self._cache.get_item('/a', 2.0, 0.5))
+        self.assertIsNone(self._cache.get_item('/c', 2.0, 0.5))
+        self.assertEqual((self._cache.hits, self._cache.misses), (2, 2))
+        self.assertEqual(self._cache.hit_rate, 0.5)
+
+    def test_stats_of_all_caches(self):
+        self._cache_item('/a', 1.0, 'x' * 10)
+        self._cache.get_item('/a', 1.0, 0.0)
+        hits, misses, nbytes = get_timeline_cache_stats()
+        self.assertGreaterEqual(hits, 1)
+        self.assertGreaterEqual(nbytes, 10)
+
+    def test_evicts_least_recently_used_over_byte_budget(self):
+        self._cache_item('/a', 1.0, 'x' * 10)
+        self._cache_item('/b', 2.0, 'y' * 10)
+        self._cache_item('/a', 3.0, 'z' * 10)
+        self.assertEqual(self._cache.nbytes, 30)
+
+        # Accessing the oldest item makes the second one the least recently used
+        self.assertIsNotNone(self._cache.get_item('/a', 1.0, 0.0))
+        self._cache_item('/b', 4.0, 'w' * 5)
+        self.assertEqual(self._cache.nbytes, 25)
+        self.assertIsNone(self._cache.get_item('/b', 2.0, 0.0))
+        self.assertIsNotNone(self._cache.get_item('/a', 1.0, 0.0))
+        self.assertIsNotNone(self._cache.get_item('/a', 3.0, 0.0))
+
+    def test_replaces_item_at_same_stamp(self):
+        self._cache_item('/a', 1.0, 'x' * 10)
+        self._cache_item('/a', 1.0, 'y' * 4)
+        self.assertEqual(self._cache.nbytes, 4)
+        self.assertEqual(self._cache.get_item('/a', 1.0, 0.0), 'yyyy')
+
+    def test_loads_enqueued_items_in_visible_range_first(self):
+        self._cache.set_visible_range(10.0, 20.0)
+        with self._cache.cv:
+            for stamp in [50.0, 25.0, 15.0]:
+                self._cache.pending[('/a', stamp)] = ('/a', stamp, 0.0, None)
+            self.assertEqual(self._cache._next_entry()[1], 15.0)
+            self.assertEqual(self._cache._next_entry()[1], 25.0)
+            # 50.0 is more than a range width away from the visible range, so it was dropped
+            self.assertIsNone(self._cache._next_entry())
+            self.assertEqual(len(self._cache.pending), 0)
+
+
+
+class TestStampSkipList(unittest.TestCase):
+
+    def test_matches_sorted_list(self):
+        rand = random.Random(0)
+        skip_list = _StampSkipList()
+        stamps = set()
+        for _ in range(2000):
+            stamp = float(rand.randint(0, 500))
+            if stamp in stamps and rand.random() < 0.5:
+                skip_list.remove(stamp)
+                stamps.remove(stamp)
+            else:
+                skip_list.add(stamp)
+                stamps.add(stamp)
+        self.assertEqual(list(skip_list), sorted(stamps))
+        self.assertEqual(len(skip_list), len(stamps))
+
+        for stamp in [-10.0, 0.3, 100.5, 250.0, 1000.0]:
+            expected = min(sorted(stamps), key=lambda candidate: abs(candidate - stamp))
+            self.assertEqual(skip_list.closest(stamp), expected)
+
+    def test_closest(self):
+        skip_list = _StampSkipList()
+        self.assertIsNone(skip_list.closest(1.0))
+        for stamp in [1.0, 3.0]:
+            skip_list.add(stamp)
+        self.assertEqual(skip_list.closest(0.0), 1.0)
+        self.assertEqual(skip_list.closest(2.0), 1.0)
+        self.assertEqual(skip_list.closest(2.1), 3.0)
+        self.assertEqual(skip_list.closest(3.0), 3.0)
+        self.assertRaises(KeyError, skip_list.remove, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
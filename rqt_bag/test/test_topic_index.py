@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import math
+import unittest
+
+import numpy
+
+from rqt_bag.topic_index import TopicIndex
+
+
+def _find_regions(stamps, max_interval):
+    """
+    The region grouping TimelineFrame used before TopicIndex.get_regions, kept as the reference.
+    """
+    region_start, prev_stamp = None, None
+    for stamp in stamps:
+        if prev_stamp:
+            if stamp - prev_stamp > max_interval:
+                region_end = prev_stamp
+                yield (region_start, region_end)
+                region_start = stamp
+        else:
+            region_start = stamp
+
+        prev_stamp = stamp
+
+    if region_start and prev_stamp:
+        yield (region_start, prev_stamp)
+
+
+def _get_bucket_interval(max_interval):
+    return 2.0 ** (math.floor(2.0 * math.log(max_interval, 2)) / 2.0)
+
+
+class TestTopicIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Bursts of messages with gaps of all sizes between them
+        random = numpy.random.RandomState(0)
+        self._stamps = 1000.0 + numpy.cumsum(random.exponential(0.5, 5000) ** 3)
+
+    def _get_regions(self, topic_index, max_interval, start_stamp=None, end_stamp=None):
+        starts, ends = topic_index.get_regions(max_interval, start_stamp, end_stamp)
+        return zip(starts.tolist(), ends.tolist())
+
+    def test_extend(self):
+        topic_index = TopicIndex()
+        self.assertEqual(len(topic_index), 0)
+        for i in range(0, len(self._stamps), 700):
+            topic_index.extend(self._stamps[i:i + 700].tolist())
+        topic_index.extend([])
+        self.assertEqual(len(topic_index), len(self._stamps))
+        numpy.testing.assert_array_equal(topic_index.stamps, self._stamps)
+        self.assertEqual(topic_index[-1], self._stamps[-1])
+
+    def test_extend_initial_stamps(self):
+        topic_index = TopicIndex(self._stamps[:10])
+        topic_index.extend(self._stamps[10:])
+        numpy.testing.assert_array_equal(topic_index.stamps, self._stamps)
+
+    def test_stamps_taken_before_extend_unchanged(self):
+        topic_index = TopicIndex()
+        topic_index.extend(self._stamps[:100])
+        stamps = topic_index.stamps
+        topic_index.extend(self._stamps[100:])
+        numpy.testing.assert_array_equal(stamps, self._stamps[:100])
+
+
+    def test_regions_match_find_regions(self):
+        topic_index = TopicIndex(self._stamps)
+        for max_interval in [0.01, 0.3, 1.0, 2.0, 5.5, 40.0, 0.0]:
+            bucket_interval = _get_bucket_interval(max_interval) if max_interval > 0.0 else 0.0
+            expected = list(_find_regions(self._stamps.tolist(), bucket_interval))
+            self.assertEqual(self._get_regions(topic_index, max_interval), expected)
+
+    def test_coarse_regions_merged_from_finer_level(self):
+        topic_index = TopicIndex(self._stamps)
+        # Build the finer levels first, so the coarser levels are merged from them
+        for max_interval in [0.1, 0.7, 3.0, 20.0]:
+            expected = list(_find_regions(self._stamps.tolist(), _get_bucket_interval(max_interval)))
+            self.assertEqual(self._get_regions(topic_index, max_interval), expected)
+
+    def test_regions_updated_after_extend(self):
+        topic_index = TopicIndex(self._stamps[:2000])
+        self._get_regions(topic_index, 1.0)
+        topic_index.extend(self._stamps[2000:])
+        expected = list(_find_regions(self._stamps.tolist(), 1.0))
+        self.assertEqual(self._get_regions(topic_index, 1.0), expected)
+
+    def test_regions_in_range(self):
+        topic_index = TopicIndex(self._stamps)
+        start_stamp, end_stamp = self._stamps[1000], self._stamps[3000]
+        regions = list(_find_regions(self._stamps.tolist(), 1.0))
+        expected = [(start, end) for start, end in regions if end >= start_stamp and start < end_stamp]
+        self.assertEqual(self._get_regions(topic_index, 1.0, start_stamp, end_stamp), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
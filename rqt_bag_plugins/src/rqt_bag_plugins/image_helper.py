@@ -32,10 +32,55 @@
 
 import array
 from cStringIO import StringIO
+import math
 import sys
 
 import Image
 import cairo
+import numpy
+
+from python_qt_binding.QtGui import QImage, qRgb
+
+# raw encoding -> (number of channels, PIL mode, channel order of the PIL mode or None if it is the same)
+_raw_encodings = {
+    'mono8': (1, 'L', None),
+    'rgb8': (3, 'RGB', None),
+    'bgr8': (3, 'RGB', [2, 1, 0]),
+    'rgba8': (4, 'RGBA', None),
+    'bgra8': (4, 'RGBA', [2, 1, 0, 3]),
+}
+
+# single channel 16-bit or float encoding -> pixel type, displayed auto-ranged to 8 bits
+_depth_encodings = {
+    'mono16': numpy.uint16,
+    '16UC1': numpy.uint16,
+    '32FC1': numpy.float32,
+}
+
+# 8-bit Bayer encoding -> colors of the 2x2 cell in row-major order
+_bayer_encodings = {
+    'bayer_rggb8': 'rggb',
+    'bayer_bggr8': 'bggr',
+    'bayer_gbrg8': 'gbrg',
+    'bayer_grbg8': 'grbg',
+}
+
+# QImage.Format_ARGB32 holds native-endian 32-bit ARGB pixels, i.e. B, G, R, A bytes on little-endian machines
+if sys.byteorder == 'little':
+    _argb32_from_rgba, _argb32_from_bgra = [2, 1, 0, 3], None
+else:
+    _argb32_from_rgba, _argb32_from_bgra = [3, 0, 1, 2], [3, 2, 1, 0]
+
+# raw encoding -> (QImage format, channel order of the format or None if it is the same)
+_qimage_encodings = {
+    'mono8': (QImage.Format_Indexed8, None),
+    'rgb8': (QImage.Format_RGB888, None),
+    'bgr8': (QImage.Format_RGB888, [2, 1, 0]),
+    'rgba8': (QImage.Format_ARGB32, _argb32_from_rgba),
+    'bgra8': (QImage.Format_ARGB32, _argb32_from_bgra),
+}
+
+_gray_color_table = [qRgb(i, i, i) for i in range(256)]
 
 
 def imgmsg_to_pil(img_msg, rgba=True):
@@ -79,6 +124,170 @@ def imgmsg_to_pil(img_msg, rgba=True):
         return None
 
 
+def imgmsg_to_qimage(img_msg, stride=1):
+    """
+    Converts a raw image message to a QImage built directly over the pixel data.
+
+    mono8, rgb8 and (on little-endian machines) bgra8 images wrap the message data without copying it.
+    bgr8 and rgba8 images take a single copy to reorder the channels.
+    16-bit, float and Bayer images are converted to 8 bits, taking only every stride-th pixel of every stride-th row.
+    The image doesn't own its pixel data, so the returned buffer must be kept alive as long as the image is used.
+    :param stride: subsampling step for the converted encodings, ''int''
+    :returns: the image and its buffer, or (None, None) if the encoding isn't supported, ''(QImage, object)''
+    """
+    if img_msg._type != 'sensor_msgs/Image':
+        return None, None
+
+    if img_msg.encoding in _qimage_encodings:
+        image_format, channel_order = _qimage_encodings[img_msg.encoding]
+        if channel_order is None:
+            buf, bytes_per_line = img_msg.data, img_msg.step
+        else:
+            pixels, _ = _imgmsg_to_array(img_msg)
+            buf = numpy.ascontiguousarray(pixels[:, :, channel_order])
+            bytes_per_line = buf.strides[0]
+        return _buffer_to_qimage(buf, img_msg.width, img_msg.height, bytes_per_line, image_format), buf
+
+    pixels, mode = _imgmsg_to_display_array(img_msg, stride)
+    if pixels is None:
+        return None, None
+    buf = numpy.ascontiguousarray(pixels)
+    image_format = QImage.Format_Indexed8 if mode == 'L' else QImage.Format_RGB888
+    return _buffer_to_qimage(buf, buf.shape[1], buf.shape[0], buf.strides[0], image_format), buf
+
+
+def _buffer_to_qimage(buf, width, height, bytes_per_line, image_format):
+    qimage = QImage(buf, width, height, bytes_per_line, image_format)
+    if image_format == QImage.Format_Indexed8:
+        qimage.setColorTable(_gray_color_table)
+    return qimage
+
+
+def imgmsg_to_thumbnail(img_msg, thumbnail_height, quality=Image.NEAREST):
+    """
+    Converts an image message to a thumbnail, decoding no more of the image than needed.
+
+    JPEG compressed images are decoded at a reduced scale. Raw 8-bit images are subsampled straight from the message data,
+    16-bit, float and Bayer images are subsampled before converting them. Other images are converted at full resolution.
+    """
+    try:
+        if img_msg._type == 'sensor_msgs/CompressedImage':
+            pil_img = Image.open(StringIO(img_msg.data))
+            width, height = pil_img.size
+            # Let the JPEG decoder scale down to the smallest size which is still at least the thumbnail size
+            pil_img.draft(pil_img.mode, (_get_thumbnail_width(width, height, thumbnail_height), thumbnail_height))
+            if pil_img.mode != 'L':
+                pil_img = pil_bgr2rgb(pil_img)
+        elif img_msg.encoding in _raw_encodings or img_msg.encoding in _depth_encodings or img_msg.encoding in _bayer_encodings:
+            width, height = img_msg.width, img_msg.height
+            if img_msg.encoding in _bayer_encodings:
+                # Demosaicing already halves the resolution
+                stride = max(1, height // (2 * thumbnail_height))
+            else:
+                stride = max(1, height // thumbnail_height)
+            pixels, mode = _imgmsg_to_display_array(img_msg, stride)
+            pil_img = Image.fromarray(numpy.ascontiguousarray(pixels), mode)
+        else:
+            pil_img = imgmsg_to_pil(img_msg)
+            if not pil_img:
+                return None
+            width, height = pil_img.size
+
+        return pil_img.resize((_get_thumbnail_width(width, height, thumbnail_height), thumbnail_height), quality)
+
+    except Exception, ex:
+        print >> sys.stderr, 'Can\'t convert image: %s' % ex
+        return None
+
+
+def _get_thumbnail_width(width, height, thumbnail_height):
+    # Maintain the aspect ratio
+    return max(1, int(round(thumbnail_height * (float(width) / height))))
+
+
+def _imgmsg_to_array(img_msg, stride=1):
+    """
+    Views every stride-th pixel of every stride-th row of a raw 8-bit image message, without copying the message data.
+    :returns: the pixels and their PIL mode, ''(numpy.array, str)''
+    """
+    channels, mode, _ = _raw_encodings[img_msg.encoding]
+    rows = numpy.frombuffer(img_msg.data, dtype=numpy.uint8, count=img_msg.height * img_msg.step).reshape(img_msg.height, img_msg.step)
+    pixels = rows[::stride, :img_msg.width * channels].reshape(-1, img_msg.width, channels)[:, ::stride]
+    return pixels, mode
+
+
+def _imgmsg_to_display_array(img_msg, stride=1):
+    """
+    Converts every stride-th pixel of every stride-th row of a raw image message to 8-bit pixels for display.
+    Bayer images are demosaiced at half resolution before subsampling.
+    :returns: the pixels and their PIL mode, or (None, None) if the encoding isn't supported, ''(numpy.array, str)''
+    """
+    if img_msg.encoding in _raw_encodings:
+        pixels, mode = _imgmsg_to_array(img_msg, stride)
+        channel_order = _raw_encodings[img_msg.encoding][2]
+        if channel_order is not None:
+            pixels = pixels[:, :, channel_order]
+        if mode == 'L':
+            pixels = pixels[:, :, 0]
+        return pixels, mode
+
+    if img_msg.encoding in _depth_encodings:
+        return _autorange(_imgmsg_to_depth_array(img_msg, stride)), 'L'
+
+    if img_msg.encoding in _bayer_encodings:
+        return _demosaic_bayer(img_msg, stride), 'RGB'
+
+    return None, None
+
+
+def _imgmsg_to_depth_array(img_msg, stride=1):
+    """
+    Views every stride-th pixel of every stride-th row of a single channel 16-bit or float image message.
+    """
+    dtype = numpy.dtype(_depth_encodings[img_msg.encoding]).newbyteorder('>' if img_msg.is_bigendian else '<')
+    row_length = img_msg.step // dtype.itemsize
+    rows = numpy.frombuffer(img_msg.data, dtype=dtype, count=img_msg.height * row_length).reshape(img_msg.height, row_length)
+    return rows[::stride, :img_msg.width:stride]
+
+
+def _autorange(pixels, low_percentile=1.0, high_percentile=99.0, max_samples=10000):
+    """
+    Scales pixels to 8 bits, mapping the low and high percentiles of the pixel values to black and white.
+
+    The percentiles are computed on a subsample of at most about max_samples pixels, so the cost is one vectorized pass.
+    Zero and non-finite pixels are treated as missing data: they are left out of the percentiles and shown black.
+    """
+    sample_stride = max(1, int(math.sqrt(pixels.size / float(max_samples))))
+    sample = pixels[::sample_stride, ::sample_stride].astype(numpy.float32)
+    sample = sample[numpy.isfinite(sample) & (sample != 0)]
+    if len(sample) == 0:
+        return numpy.zeros(pixels.shape, dtype=numpy.uint8)
+
+    low, high = numpy.percentile(sample, [low_percentile, high_percentile])
+    scaled = (pixels.astype(numpy.float32) - low) * (255.0 / max(high - low, 1e-6))
+    scaled[~numpy.isfinite(scaled) | (pixels == 0)] = 0
+    return numpy.clip(scaled, 0, 255).astype(numpy.uint8)
+
+
+def _demosaic_bayer(img_msg, stride=1):
+    """
+    Demosaics every stride-th 2x2 cell of every stride-th row of cells of an 8-bit Bayer image message into one RGB pixel,
+    averaging the two green samples of the cell.
+    """
+    rows = numpy.frombuffer(img_msg.data, dtype=numpy.uint8, count=img_msg.height * img_msg.step).reshape(img_msg.height, img_msg.step)
+    height, width = 2 * (img_msg.height // 2), 2 * (img_msg.width // 2)
+    cell_stride = 2 * stride
+
+    planes = {'r': [], 'g': [], 'b': []}
+    for index, color in enumerate(_bayer_encodings[img_msg.encoding]):
+        dy, dx = divmod(index, 2)
+        planes[color].append(rows[dy:height:cell_stride, dx:width:cell_stride])
+
+    (red,), (green1, green2), (blue,) = planes['r'], planes['g'], planes['b']
+    green = ((green1.astype(numpy.uint16) + green2) >> 1).astype(numpy.uint8)
+    return numpy.dstack((red, green, blue))
+
+
 def pil_bgr2rgb(pil_img):
     rgb2bgr = (0, 0, 1, 0,
                0, 1, 0, 0,
@@ -39,7 +39,8 @@ from .image_view import ImageView
 class ImagePlugin(Plugin):
 
     def __init__(self):
-        pass
+        # Start the thumbnail processes before the timeline starts its threads, as Python 2 forks them
+        ImageTimelineRenderer.start_thumbnail_pool()
 
     def get_view_class(self):
         return ImageView
@@ -32,7 +32,11 @@
 
 import rospy
 
+import multiprocessing
 import sys
+import threading
+
+import roslib.message
 
 import Image
 import ImageQt
@@ -40,6 +44,7 @@ import ImageQt
 from rqt_bag import TimelineCache, TimelineRenderer
 
 import image_helper
+from thumbnail_store import ThumbnailStore
 
 from python_qt_binding.QtCore import Qt
 from python_qt_binding.QtGui import QBrush, QPen, QPixmap
@@ -48,7 +53,22 @@ from python_qt_binding.QtGui import QBrush, QPen, QPixmap
 class ImageTimelineRenderer(TimelineRenderer):
     """
     Draws thumbnails of sensor_msgs/Image or sensor_msgs/CompressedImage in the timeline.
+
+    Thumbnails are decoded and scaled in a pool of processes, one per core, so they are generated in parallel. The pool is
+    shared by all renderers and started when the image plugin is loaded. The loader threads read the messages from the
+    bag and submit them to the pool without waiting for the result, keeping up to one thumbnail per process in flight;
+    the thumbnails are cached when the pool returns them.
+    Generated thumbnails are also kept in a ThumbnailStore, so reopened bags don't need to decode them again.
     """
+    _num_loader_threads = 2  # threads reading messages for the pool, per renderer
+
+    @staticmethod
+    def start_thumbnail_pool():
+        """
+        Starts the process pool generating thumbnails, if it isn't started yet.
+        """
+        _get_thumbnail_pool()
+
     def __init__(self, timeline, thumbnail_height=160):
         super(ImageTimelineRenderer, self).__init__(timeline, msg_combine_px=40.0)
 
@@ -58,7 +78,17 @@ class ImageTimelineRenderer(TimelineRenderer):
         self.min_thumbnail_width = 8  # don't display thumbnails if less than this many pixels across
         self.quality = Image.NEAREST  # quality hint for thumbnail scaling
 
-        self.thumbnail_cache = TimelineCache(self._load_thumbnail, lambda topic, msg_stamp, thumbnail: self.timeline.scene().update())
+        try:
+            self._thumbnail_store = ThumbnailStore()
+        except Exception, ex:
+            print >> sys.stderr, 'Error opening thumbnail store: %s' % str(ex)
+            self._thumbnail_store = None
+
+        self._generating = set()  # (bag filename, position) of the messages being generated thumbnails of
+        self._generating_lock = threading.Lock()
+
+        self.thumbnail_cache = TimelineCache(self._load_thumbnail, lambda topic, msg_stamp, thumbnail: self.timeline.scene().update(), sizeof=_get_thumbnail_bytes, num_workers=self._num_loader_threads)
+
     # TimelineRenderer implementation
 
     def get_segment_height(self, topic):
@@ -84,6 +114,9 @@ class ImageTimelineRenderer(TimelineRenderer):
         thumbnail_gap = 6
         thumbnail_x, thumbnail_y, thumbnail_height = x + 1, y + 1, height - 2 - thumbnail_gap  # leave 1px border
 
+        # Load the visible thumbnails first and drop requests which scrolled out of view
+        self.thumbnail_cache.set_visible_range(self.timeline._stamp_left - max_interval_thumbnail, self.timeline._stamp_right + max_interval_thumbnail)
+
         # set color to white draw rectangle over messages
         painter.setBrush(QBrush(Qt.white))
         painter.drawRect(x, y, width, height - thumbnail_gap)
@@ -133,10 +166,13 @@ class ImageTimelineRenderer(TimelineRenderer):
         if self.thumbnail_cache:
             self.thumbnail_cache.stop()
             self.thumbnail_cache.join()
+        if self._thumbnail_store:
+            self._thumbnail_store.close()
 
     def _load_thumbnail(self, topic, stamp, thumbnail_details):
         """
-        Loads the thumbnail from the bag
+        Loads the thumbnail from the thumbnail store, or submits the message to the process pool to generate it. Generated
+        thumbnails are cached by _thumbnail_generated, so (None, None) is returned for them.
         """
         (thumbnail_height,) = thumbnail_details
 
@@ -147,33 +183,124 @@ class ImageTimelineRenderer(TimelineRenderer):
             return None, None
         pos = entry.position
 
-        # Not in the cache; load from the bag file
+        # Not in the cache; look in the thumbnail store
+        if self._thumbnail_store:
+            stored_thumbnail = self._thumbnail_store.get(bag, topic, pos, thumbnail_height)
+            if stored_thumbnail:
+                return stored_thumbnail
+
+        # Nearby stamps map to the same message, so only generate its thumbnail once
+        key = (bag.filename, pos)
+        with self._generating_lock:
+            if key in self._generating:
+                return None, None
+            self._generating.add(key)
+
+        try:
+            # Not in the store; load from the bag file
+            msg_topic, (datatype, data, _, _, _), msg_stamp = self.timeline.scene().read_message(bag, pos, raw=True)
+        except Exception, ex:
+            print >> sys.stderr, 'Error loading image on topic %s: %s' % (topic, str(ex))
+            with self._generating_lock:
+                self._generating.discard(key)
+            return None, None
+
+        # Decode and scale in the process pool, waiting while each process has a thumbnail to generate
+        _thumbnail_slots.acquire()
 
-        with self.timeline.scene()._bag_lock:
-            msg_topic, msg, msg_stamp = bag._read_message(pos)
+        def release():
+            _thumbnail_slots.release()
+            with self._generating_lock:
+                self._generating.discard(key)
+
+        def callback(result):
+            release()
+            self._thumbnail_generated(bag, topic, pos, thumbnail_height, msg_stamp, result)
 
-        # Convert from ROS image to PIL image
         try:
-            pil_image = image_helper.imgmsg_to_pil(msg)
+            _get_thumbnail_pool().apply_async(_create_thumbnail, (datatype, data, thumbnail_height, self.quality), callback=callback)
         except Exception, ex:
             print >> sys.stderr, 'Error loading image on topic %s: %s' % (topic, str(ex))
-            pil_image = None
+            release()
+        return None, None
 
-        if not pil_image:
+    def _thumbnail_generated(self, bag, topic, pos, thumbnail_height, msg_stamp, result):
+        """
+        Caches a thumbnail generated by the process pool. Called on the result thread of the pool.
+        :param result: the result of _create_thumbnail, ''((str, (int, int), str), str)''
+        """
+        thumbnail, error = result
+        if not thumbnail:
+            if error:
+                print >> sys.stderr, 'Error loading image on topic %s: %s' % (topic, error)
             print >> sys.stderr, 'Disabling renderer on %s' % topic
             self.timeline.set_renderer_active(topic, False)
-            return None, None
+            return
 
-        # Calculate width to maintain aspect ratio
         try:
-            pil_image_size = pil_image.size
-            thumbnail_width = int(round(thumbnail_height * (float(pil_image_size[0]) / pil_image_size[1])))
-            # Scale to thumbnail size
-            thumbnail = pil_image.resize((thumbnail_width, thumbnail_height), self.quality)
+            mode, size, pixels = thumbnail
+            thumbnail = Image.fromstring(mode, size, pixels)
 
-            return msg_stamp, thumbnail
+            if self._thumbnail_store:
+                self._thumbnail_store.put(bag, topic, pos, thumbnail_height, msg_stamp, thumbnail)
 
+            self.thumbnail_cache.cache_item(topic, msg_stamp, thumbnail)
+            self.timeline.scene().update()
         except Exception, ex:
-            print >> sys.stderr, 'Error loading image on topic %s: %s' % (topic, str(ex))
-            raise
-            return None, None
+            print >> sys.stderr, 'Error caching thumbnail on topic %s: %s' % (topic, str(ex))
+
+
+_thumbnail_pool = None
+_thumbnail_pool_lock = threading.Lock()
+_thumbnail_slots = threading.Semaphore(multiprocessing.cpu_count())  # one per process of the pool
+
+
+def _get_thumbnail_pool():
+    """
+    Starts the process pool generating thumbnails if it isn't started yet. Where the multiprocessing module supports it, the
+    worker processes are started from a fresh interpreter instead of forking the threaded GUI process, whose children
+    could deadlock on locks held by other threads at the time of the fork.
+
+    Python 2 can only fork, so the pool is started when the image plugin is loaded, before the timeline starts its
+    threads. Threads of rqt itself may be running by then; forking is still safe as the workers only deserialize and
+    scale images, so they never take a lock which another thread could have held at the fork, and never use Qt.
+    :returns: the process pool shared by all renderers, ''multiprocessing.Pool''
+    """
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is None:
+            if hasattr(multiprocessing, 'get_context'):
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+            else:
+                context = multiprocessing
+            _thumbnail_pool = context.Pool(multiprocessing.cpu_count())
+        return _thumbnail_pool
+
+
+def _create_thumbnail(datatype, data, thumbnail_height, quality):
+    """
+    Deserializes an image message and scales it to a thumbnail. Runs in the thumbnail process pool. Errors are returned
+    rather than raised, as the pool doesn't call the callback of a failed task.
+    :returns: mode, size and pixel data of the thumbnail, or None if the image can't be converted, and the error if
+              there was one, ''((str, (int, int), str), str)''
+    """
+    try:
+        msg = roslib.message.get_message_class(datatype)()
+        msg.deserialize(data)
+
+        # Convert from ROS image to a PIL thumbnail
+        thumbnail = image_helper.imgmsg_to_thumbnail(msg, thumbnail_height, quality)
+    except Exception, ex:
+        return None, str(ex)
+    if not thumbnail:
+        return None, None
+
+    return (thumbnail.mode, thumbnail.size, thumbnail.tostring()), None
+
+
+def _get_thumbnail_bytes(thumbnail):
+    """
+    :returns: size of the pixel data of a PIL thumbnail in bytes
+    """
+    width, height = thumbnail.size
+    return width * height * len(thumbnail.getbands())
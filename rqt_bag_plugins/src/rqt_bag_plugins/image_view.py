@@ -36,7 +36,8 @@ import ImageQt
 from rqt_bag import TopicMessageView
 import image_helper
 
-from python_qt_binding.QtGui import QGraphicsScene, QGraphicsView, QPixmap
+from python_qt_binding.QtCore import Qt
+from python_qt_binding.QtGui import QGraphicsScene, QGraphicsView, QPixmap, QTransform
 
 
 class ImageView(TopicMessageView):
@@ -49,6 +50,7 @@ class ImageView(TopicMessageView):
         super(ImageView, self).__init__(timeline, parent)
 
         self._image = None
+        self._pixmap_item = None
         self._image_topic = None
         self._image_stamp = None
         self.quality = Image.NEAREST  # quality hint for scaling
@@ -87,20 +89,43 @@ class ImageView(TopicMessageView):
 
     # End MessageView implementation
     def put_image_into_scene(self):
-        if self._image:
-            resized_image = self._image.resize((self._image_view.size().width() - 2, self._image_view.size().height() - 2), self.quality)
+        if self._pixmap_item:
+            # Scale the pixmap to the view when drawing instead of resizing the image
+            pixmap = self._pixmap_item.pixmap()
+            self._pixmap_item.setTransform(QTransform.fromScale(float(self._image_view.size().width() - 2) / pixmap.width(),
+                                                                float(self._image_view.size().height() - 2) / pixmap.height()))
 
-            QtImage = ImageQt.ImageQt(resized_image)
-            pixmap = QPixmap.fromImage(QtImage)
-            self._scene.clear()
-            self._scene.addPixmap(pixmap)
+    def _get_stride(self, image_msg):
+        """
+        Subsampling step which keeps converted images at least as large as the view, bounding the cost per frame.
+        """
+        if image_msg._type != 'sensor_msgs/Image':
+            return 1
+        view_width = max(1, self._image_view.size().width() - 2)
+        view_height = max(1, self._image_view.size().height() - 2)
+        return max(1, min(image_msg.width // view_width, image_msg.height // view_height))
 
     def set_image(self, image_msg, image_topic, image_stamp):
         self._image_msg = image_msg
+        self._image = None
+        qimage = None
         if image_msg:
-            self._image = image_helper.imgmsg_to_pil(image_msg)
-        else:
-            self._image = None
+            # Build the QImage over the message data if possible, otherwise convert through PIL
+            qimage, _buffer = image_helper.imgmsg_to_qimage(image_msg, self._get_stride(image_msg))
+            if qimage is None:
+                self._image = image_helper.imgmsg_to_pil(image_msg)
+                if self._image:
+                    qimage = ImageQt.ImageQt(self._image)
+
+        self._scene.clear()
+        self._pixmap_item = None
+        if qimage is not None:
+            # Copies the pixels, so the buffer isn't needed afterwards
+            self._pixmap_item = self._scene.addPixmap(QPixmap.fromImage(qimage))
+            if self.quality == Image.NEAREST:
+                self._pixmap_item.setTransformationMode(Qt.FastTransformation)
+            else:
+                self._pixmap_item.setTransformationMode(Qt.SmoothTransformation)
         self._image_topic = image_topic
         self._image_stamp = image_stamp
         self.put_image_into_scene()
@@ -0,0 +1,227 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Persistent store of image thumbnails, shared across rqt_bag sessions.
+
+Thumbnails are kept in an SQLite database under the ROS home directory, keyed by bag identity (path, size and
+modification time), topic, message position and thumbnail height. Opaque thumbnails are stored as JPEG, others as PNG.
+The least recently used thumbnails are deleted once the store exceeds its size cap.
+
+The database uses write-ahead logging. New thumbnails and access times are committed in batches, after
+_commit_interval changes or on the first access once changes are _commit_period seconds old, and when the store is
+closed, so loading thumbnails doesn't wait for a disk sync per thumbnail.
+"""
+
+from cStringIO import StringIO
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import Image
+import rospkg
+import rospy
+
+from rqt_bag import bag_helper
+
+
+class ThumbnailStore(object):
+    """
+    On-disk store of thumbnails. Thread-safe.
+    """
+    _evict_interval = 100  # check the size cap every this many stored thumbnails
+    _commit_interval = 100  # commit after this many stored or accessed thumbnails
+    _commit_period = 5.0  # commit changes older than this many seconds
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024, jpeg_quality=85):
+        """
+        @param path: path of the database, defaults to thumbnails.db in the rqt_bag directory of the ROS home
+        @type  path: str
+        @param max_bytes: maximum total size of the stored thumbnails
+        @type  max_bytes: int
+        @param jpeg_quality: quality of the JPEG encoded thumbnails
+        @type  jpeg_quality: int
+        """
+        if path is None:
+            path = os.path.join(rospkg.get_ros_home(), 'rqt_bag', 'thumbnails.db')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+
+        self._lock = threading.Lock()
+        self._bag_ids = {}  # bag -> bag identity, or None if the bag can't be stored
+        self._puts = 0
+        self._accessed = {}  # key -> access time of the thumbnails read since the last commit
+        self._changes = 0  # number of uncommitted changes
+        self._last_commit = time.time()
+
+        store_dir = os.path.dirname(path)
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS thumbnails (
+                                bag_id TEXT, topic TEXT, position TEXT, height INTEGER,
+                                secs INTEGER, nsecs INTEGER, data BLOB, accessed REAL,
+                                PRIMARY KEY (bag_id, topic, position, height))''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS thumbnails_accessed ON thumbnails (accessed)')
+        self._db.commit()
+
+    def get(self, bag, topic, position, height):
+        """
+        Look up a stored thumbnail.
+
+        @return: stamp of the message and the thumbnail, or None if there is no stored thumbnail
+        @rtype:  (rospy.Time, Image)
+        """
+        bag_id = self._get_bag_id(bag)
+        if bag_id is None:
+            return None
+
+        key = (bag_id, topic, str(position), height)
+        try:
+            with self._lock:
+                row = self._db.execute('SELECT secs, nsecs, data FROM thumbnails WHERE bag_id=? AND topic=? AND position=? AND height=?', key).fetchone()
+                if row is None:
+                    return None
+                self._accessed[key] = time.time()
+                self._changes += 1
+                self._commit_if_due()
+        except sqlite3.Error, ex:
+            print >> sys.stderr, 'Error reading thumbnail store %s: %s' % (self.path, str(ex))
+            return None
+
+        secs, nsecs, data = row
+        thumbnail = Image.open(StringIO(str(data)))
+        thumbnail.load()
+        return rospy.Time(secs, nsecs), thumbnail
+
+    def put(self, bag, topic, position, height, msg_stamp, thumbnail):
+        """
+        Store a thumbnail, deleting the least recently used thumbnails if the store exceeds its size cap.
+
+        @param msg_stamp: stamp of the message
+        @type  msg_stamp: rospy.Time
+        @param thumbnail: the thumbnail
+        @type  thumbnail: Image
+        """
+        bag_id = self._get_bag_id(bag)
+        if bag_id is None:
+            return
+
+        data = self._encode(thumbnail)
+        try:
+            with self._lock:
+                self._db.execute('INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (bag_id, topic, str(position), height, msg_stamp.secs, msg_stamp.nsecs, sqlite3.Binary(data), time.time()))
+                self._accessed.pop((bag_id, topic, str(position), height), None)
+                self._puts += 1
+                if self._puts % self._evict_interval == 0:
+                    self._write_accessed()
+                    self._evict()
+                self._changes += 1
+                self._commit_if_due()
+        except sqlite3.Error, ex:
+            print >> sys.stderr, 'Error writing thumbnail store %s: %s' % (self.path, str(ex))
+
+    def close(self):
+        with self._lock:
+            try:
+                self._commit()
+            except sqlite3.Error, ex:
+                print >> sys.stderr, 'Error writing thumbnail store %s: %s' % (self.path, str(ex))
+            self._db.close()
+
+    def _commit_if_due(self):
+        if self._changes >= self._commit_interval or time.time() - self._last_commit >= self._commit_period:
+            self._commit()
+
+    def _commit(self):
+        self._write_accessed()
+        self._db.commit()
+        self._changes = 0
+        self._last_commit = time.time()
+
+    def _write_accessed(self):
+        if self._accessed:
+            self._db.executemany('UPDATE thumbnails SET accessed=? WHERE bag_id=? AND topic=? AND position=? AND height=?',
+                                 [(accessed,) + key for key, accessed in self._accessed.items()])
+            self._accessed = {}
+
+    def _get_bag_id(self, bag):
+        """
+        @return: identity of the bag, or None if the bag is being written
+        @rtype:  str
+        """
+        with self._lock:
+            if bag not in self._bag_ids:
+                if bag.mode != 'r':
+                    bag_id = None
+                else:
+                    bag_size, bag_mtime = bag_helper.get_bag_stat(bag)
+                    bag_id = hashlib.sha1('%s\0%d\0%r' % (bag_helper.get_bag_path(bag), bag_size, bag_mtime)).hexdigest()
+                self._bag_ids[bag] = bag_id
+            return self._bag_ids[bag]
+
+    def _encode(self, thumbnail):
+        """
+        Encode opaque thumbnails as JPEG and others as PNG.
+        """
+        if thumbnail.mode == 'RGBA' and thumbnail.split()[3].getextrema() == (255, 255):
+            thumbnail = thumbnail.convert('RGB')
+
+        buf = StringIO()
+        if thumbnail.mode in ('RGB', 'L'):
+            thumbnail.save(buf, 'JPEG', quality=self.jpeg_quality)
+        else:
+            thumbnail.save(buf, 'PNG', optimize=True)
+        return buf.getvalue()
+
+    def _evict(self):
+        (total_bytes,) = self._db.execute('SELECT COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails').fetchone()
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Delete the least recently used thumbnails down to 90% of the cap, so eviction doesn't run on every put
+        excess_bytes = total_bytes - int(self.max_bytes * 0.9)
+        rows = self._db.execute('SELECT rowid, LENGTH(data) FROM thumbnails ORDER BY accessed')
+        stale_rowids = []
+        for rowid, size in rows:
+            if excess_bytes <= 0:
+                break
+            stale_rowids.append((rowid,))
+            excess_bytes -= size
+        self._db.executemany('DELETE FROM thumbnails WHERE rowid=?', stale_rowids)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+
+from cStringIO import StringIO
+import unittest
+
+import Image
+import numpy
+
+from rqt_bag_plugins import image_helper
+
+
+class _ImageMsg(object):
+    _type = 'sensor_msgs/Image'
+
+    def __init__(self, pixels, encoding, padding=0, is_bigendian=False):
+        """
+        :param pixels: pixels of the image, ''numpy.array''
+        :param padding: number of bytes after each row, ''int''
+        """
+        self.encoding = encoding
+        self.height, self.width = pixels.shape[:2]
+        self.is_bigendian = is_bigendian
+        rows = pixels.reshape(self.height, -1).view(numpy.uint8)
+        rows = numpy.hstack((rows, numpy.zeros((self.height, padding), dtype=numpy.uint8)))
+        self.step = rows.shape[1]
+        self.data = rows.tostring()
+
+
+class _CompressedImageMsg(object):
+    _type = 'sensor_msgs/CompressedImage'
+
+    def __init__(self, image, format='JPEG'):
+        buf = StringIO()
+        image.save(buf, format)
+        self.format = format.lower()
+        self.data = buf.getvalue()
+
+
+def _create_pixels(height, width, channels):
+    return numpy.arange(height * width * channels, dtype=numpy.uint32).astype(numpy.uint8).reshape(height, width, channels)
+
+
+class TestImageHelper(unittest.TestCase):
+
+    def test_thumbnail_width_keeps_aspect_ratio(self):
+        self.assertEqual(image_helper._get_thumbnail_width(640, 480, 160), 213)
+        self.assertEqual(image_helper._get_thumbnail_width(10000, 1, 160), 1600000)
+        self.assertEqual(image_helper._get_thumbnail_width(1, 10000, 160), 1)
+
+    def test_compressed_thumbnail_decoded_at_reduced_size(self):
+        msg = _CompressedImageMsg(Image.new('RGB', (640, 480), (10, 20, 30)))
+
+        opened = []
+        open_image = image_helper.Image.open
+
+        def record_open(f):
+            opened.append(open_image(f))
+            return opened[-1]
+        image_helper.Image.open = record_open
+        try:
+            thumbnail = image_helper.imgmsg_to_thumbnail(msg, 160)
+        finally:
+            image_helper.Image.open = open_image
+
+        # The decoder scales by 1/2, the smallest scale still covering 213x160
+        self.assertEqual(opened[0].size, (320, 240))
+        self.assertEqual(thumbnail.size, (213, 160))
+
+    def test_raw_thumbnail_subsampled(self):
+        pixels = _create_pixels(240, 320, 3)
+        thumbnail = image_helper.imgmsg_to_thumbnail(_ImageMsg(pixels, 'rgb8', padding=4), 120)
+        self.assertEqual((thumbnail.mode, thumbnail.size), ('RGB', (160, 120)))
+        self.assertEqual(thumbnail.getpixel((5, 7)), tuple(pixels[14, 10]))
+
+    def test_raw_thumbnail_reorders_channels(self):
+        pixels = _create_pixels(4, 6, 3)
+        thumbnail = image_helper.imgmsg_to_thumbnail(_ImageMsg(pixels, 'bgr8'), 4)
+        self.assertEqual(thumbnail.getpixel((1, 2)), tuple(pixels[2, 1, ::-1]))
+
+        pixels = _create_pixels(4, 6, 1)
+        thumbnail = image_helper.imgmsg_to_thumbnail(_ImageMsg(pixels, 'mono8'), 4)
+        self.assertEqual(thumbnail.mode, 'L')
+        self.assertEqual(thumbnail.getpixel((1, 2)), pixels[2, 1, 0])
+
+    def test_array_views_message_data(self):
+        pixels = _create_pixels(6, 8, 4)
+        msg = _ImageMsg(pixels, 'rgba8', padding=3)
+        array, mode = image_helper._imgmsg_to_array(msg, stride=2)
+        self.assertEqual(mode, 'RGBA')
+        self.assertFalse(array.flags.owndata)
+        numpy.testing.assert_array_equal(array, pixels[::2, ::2])
+
+    def test_qimage_wraps_message_data(self):
+        for encoding, channels in [('mono8', 1), ('rgb8', 3)]:
+            msg = _ImageMsg(_create_pixels(4, 6, channels), encoding, padding=2)
+            qimage, buf = image_helper.imgmsg_to_qimage(msg)
+            self.assertIs(buf, msg.data)
+            self.assertEqual((qimage.width(), qimage.height(), qimage.bytesPerLine()), (6, 4, msg.step))
+            self.assertEqual(qimage.format(), image_helper._qimage_encodings[encoding][0])
+
+        msg = _ImageMsg(_create_pixels(4, 6, 1), 'mono8')
+        qimage, _ = image_helper.imgmsg_to_qimage(msg)
+        self.assertEqual(qimage.colorTable()[7], image_helper.qRgb(7, 7, 7))
+
+    def test_qimage_reorders_channels(self):
+        pixels = _create_pixels(4, 6, 3)
+        qimage, buf = image_helper.imgmsg_to_qimage(_ImageMsg(pixels, 'bgr8', padding=2))
+        numpy.testing.assert_array_equal(buf, pixels[:, :, ::-1])
+        self.assertEqual(qimage.bytesPerLine(), 6 * 3)
+
+        # ARGB32 pixels are native-endian 32-bit values
+        pixels = _create_pixels(4, 6, 4)
+        _, buf = image_helper.imgmsg_to_qimage(_ImageMsg(pixels, 'rgba8'))
+        r, g, b, a = [pixels[:, :, i].astype(numpy.uint32) for i in range(4)]
+        numpy.testing.assert_array_equal(buf.view(numpy.uint32)[:, :, 0], (a << 24) | (r << 16) | (g << 8) | b)
+
+        msg = _ImageMsg(pixels, 'bgra8')
+        _, buf = image_helper.imgmsg_to_qimage(msg)
+        b, g, r, a = [pixels[:, :, i].astype(numpy.uint32) for i in range(4)]
+        numpy.testing.assert_array_equal(numpy.frombuffer(buf, dtype=numpy.uint32).reshape(4, 6), (a << 24) | (r << 16) | (g << 8) | b)
+
+    def test_qimage_of_compressed_image(self):
+        msg = _CompressedImageMsg(Image.new('RGB', (4, 4)))
+        self.assertEqual(image_helper.imgmsg_to_qimage(msg), (None, None))
+
+    def test_autorange_maps_percentiles_to_full_range(self):
+        pixels = numpy.linspace(1000.0, 2000.0, 101 * 101).reshape(101, 101)
+        scaled = image_helper._autorange(pixels)
+        self.assertEqual(scaled.dtype, numpy.uint8)
+        # Values below the 1st and above the 99th percentile are clipped
+        self.assertEqual((scaled[0, 0], scaled[-1, -1]), (0, 255))
+        self.assertTrue(numpy.all(numpy.diff(scaled.ravel().astype(int)) >= 0))
+
+    def test_autorange_leaves_out_missing_data(self):
+        pixels = numpy.full((10, 10), 500.0, dtype=numpy.float32)
+        pixels[:5] = 1000.0
+        pixels[0, 0], pixels[0, 1], pixels[0, 2] = 0.0, numpy.nan, numpy.inf
+        scaled = image_helper._autorange(pixels)
+        self.assertEqual(list(scaled[0, :3]), [0, 0, 0])
+        self.assertEqual((scaled[9, 9], scaled[4, 9]), (0, 255))
+
+        self.assertFalse(numpy.any(image_helper._autorange(numpy.zeros((4, 4)))))
+
+    def test_depth_array(self):
+        pixels = numpy.arange(4 * 6, dtype=numpy.uint16).reshape(4, 6) * 1000
+        for is_bigendian in (False, True):
+            msg = _ImageMsg(pixels.astype('>u2' if is_bigendian else '<u2'), 'mono16', padding=4, is_bigendian=is_bigendian)
+            numpy.testing.assert_array_equal(image_helper._imgmsg_to_depth_array(msg, stride=2), pixels[::2, ::2])
+
+        pixels = numpy.linspace(0.5, 5.0, 4 * 6).astype(numpy.float32).reshape(4, 6)
+        msg = _ImageMsg(pixels, '32FC1')
+        numpy.testing.assert_array_equal(image_helper._imgmsg_to_depth_array(msg), pixels)
+
+    def test_depth_thumbnail_and_qimage(self):
+        pixels = numpy.arange(240 * 320, dtype=numpy.uint16).reshape(240, 320)
+        thumbnail = image_helper.imgmsg_to_thumbnail(_ImageMsg(pixels, '16UC1'), 120)
+        self.assertEqual((thumbnail.mode, thumbnail.size), ('L', (160, 120)))
+        self.assertLess(thumbnail.getpixel((0, 0)), thumbnail.getpixel((159, 119)))
+
+        qimage, buf = image_helper.imgmsg_to_qimage(_ImageMsg(pixels, 'mono16'), stride=4)
+        self.assertEqual((qimage.width(), qimage.height()), (80, 60))
+        self.assertEqual(qimage.format(), image_helper.QImage.Format_Indexed8)
+        self.assertEqual(buf.dtype, numpy.uint8)
+
+    def test_demosaic_bayer(self):
+        # Each 2x2 cell holds red 10, greens 20 and 41, and blue 50 in its encoding's order
+        values = {'r': 10, 'g': [20, 41], 'b': 50}
+        for encoding, colors in image_helper._bayer_encodings.items():
+            greens = list(values['g'])
+            cell = [values[color] if color != 'g' else greens.pop(0) for color in colors]
+            pixels = numpy.tile(numpy.array(cell, dtype=numpy.uint8).reshape(2, 2), (3, 4))
+            demosaiced = image_helper._demosaic_bayer(_ImageMsg(pixels, encoding, padding=2))
+            self.assertEqual(demosaiced.shape, (3, 4, 3))
+            self.assertEqual(list(demosaiced[2, 3]), [10, 30, 50])
+
+    def test_bayer_thumbnail_subsampled(self):
+        pixels = numpy.zeros((480, 640), dtype=numpy.uint8)
+        pixels[0::2, 0::2] = 200
+        thumbnail = image_helper.imgmsg_to_thumbnail(_ImageMsg(pixels, 'bayer_rggb8'), 120)
+        self.assertEqual((thumbnail.mode, thumbnail.size), ('RGB', (160, 120)))
+        self.assertEqual(thumbnail.getpixel((80, 60)), (200, 0, 0))
+
+    def test_unsupported_encoding(self):
+        msg = _ImageMsg(_create_pixels(2, 2, 3), '8UC3')
+        self.assertIsNone(image_helper.imgmsg_to_thumbnail(msg, 2))
+        self.assertEqual(image_helper.imgmsg_to_qimage(msg), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
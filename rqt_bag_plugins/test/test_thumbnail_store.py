@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import Image
+import rospy
+
+from rqt_bag_plugins.thumbnail_store import ThumbnailStore
+
+
+class _Bag(object):
+
+    def __init__(self, filename, mode='r'):
+        self.filename = filename
+        self.mode = mode
+
+
+def _create_thumbnail(mode='RGB', size=(32, 24)):
+    # Noise doesn't compress, so every thumbnail takes about the same space
+    data = os.urandom(size[0] * size[1] * len(mode))
+    return Image.frombuffer(mode, size, data, 'raw', mode, 0, 1)
+
+
+class TestThumbnailStore(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'thumbnails.db')
+        bag_path = os.path.join(self._dir, 'a.bag')
+        with open(bag_path, 'w') as f:
+            f.write('bag')
+        self._bag = _Bag(bag_path)
+        self._store = ThumbnailStore(self._path)
+
+    def tearDown(self):
+        self._store.close()
+        shutil.rmtree(self._dir)
+
+    def _total_bytes(self):
+        (total_bytes,) = self._store._db.execute('SELECT SUM(LENGTH(data)) FROM thumbnails').fetchone()
+        return total_bytes
+
+    def test_put_and_get(self):
+        self.assertIsNone(self._store.get(self._bag, '/image', (10, 20), 160))
+
+        thumbnail = _create_thumbnail()
+        self._store.put(self._bag, '/image', (10, 20), 160, rospy.Time(5, 6), thumbnail)
+        msg_stamp, stored_thumbnail = self._store.get(self._bag, '/image', (10, 20), 160)
+        self.assertEqual((msg_stamp.secs, msg_stamp.nsecs), (5, 6))
+        self.assertEqual((stored_thumbnail.mode, stored_thumbnail.size), ('RGB', (32, 24)))
+
+        # The key includes the topic, position and height
+        self.assertIsNone(self._store.get(self._bag, '/other', (10, 20), 160))
+        self.assertIsNone(self._store.get(self._bag, '/image', (10, 21), 160))
+        self.assertIsNone(self._store.get(self._bag, '/image', (10, 20), 80))
+
+    def test_transparent_thumbnail_kept_lossless(self):
+        thumbnail = _create_thumbnail('RGBA')
+        self._store.put(self._bag, '/image', 0, 160, rospy.Time(1, 0), thumbnail)
+        _, stored_thumbnail = self._store.get(self._bag, '/image', 0, 160)
+        self.assertEqual(stored_thumbnail.mode, 'RGBA')
+        self.assertEqual(list(stored_thumbnail.getdata()), list(thumbnail.getdata()))
+
+    def test_persists_across_sessions(self):
+        self._store.put(self._bag, '/image', 0, 160, rospy.Time(1, 0), _create_thumbnail())
+        self._store.close()
+
+        self._store = ThumbnailStore(self._path)
+        self.assertIsNotNone(self._store.get(self._bag, '/image', 0, 160))
+
+    def test_modified_bag_not_matched(self):
+        self._store.put(self._bag, '/image', 0, 160, rospy.Time(1, 0), _create_thumbnail())
+        self._store.close()
+
+        with open(self._bag.filename, 'a') as f:
+            f.write('more')
+        self._store = ThumbnailStore(self._path)
+        self.assertIsNone(self._store.get(self._bag, '/image', 0, 160))
+
+    def test_bag_being_recorded_not_stored(self):
+        bag = _Bag(self._bag.filename, 'w')
+        self._store.put(bag, '/image', 0, 160, rospy.Time(1, 0), _create_thumbnail())
+        self.assertIsNone(self._store.get(bag, '/image', 0, 160))
+        self.assertIsNone(self._total_bytes())
+
+    def test_evicts_least_recently_used_to_90_percent_of_cap(self):
+        self._store._evict_interval = 1
+        self._store.put(self._bag, '/image', 0, 160, rospy.Time(0, 0), _create_thumbnail())
+        thumbnail_bytes = self._total_bytes()
+        self._store.max_bytes = int(thumbnail_bytes * 10.5)
+
+        for position in range(1, 10):
+            self._store.put(self._bag, '/image', position, 160, rospy.Time(position, 0), _create_thumbnail())
+        self.assertLessEqual(self._total_bytes(), self._store.max_bytes)
+
+        # Reading the first thumbnail makes the second the least recently used
+        self.assertIsNotNone(self._store.get(self._bag, '/image', 0, 160))
+        self._store.put(self._bag, '/image', 10, 160, rospy.Time(10, 0), _create_thumbnail())
+
+        self.assertLessEqual(self._total_bytes(), int(self._store.max_bytes * 0.9))
+        self.assertIsNotNone(self._store.get(self._bag, '/image', 0, 160))
+        self.assertIsNone(self._store.get(self._bag, '/image', 1, 160))
+        self.assertIsNotNone(self._store.get(self._bag, '/image', 10, 160))
+
+
+if __name__ == '__main__':
+    unittest.main()